@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_area_user_area"),
+        ("attendance", "0005_timelog_date_shop_idx"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["area", "last_name"], name="user_area_last_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["area", "first_name"], name="user_area_first_name_idx"
+            ),
+        ),
+    ]
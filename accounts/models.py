@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.utils import timezone
@@ -33,6 +34,14 @@ class User(AbstractUser):
 
     class Meta:
         unique_together = ('first_name', 'last_name')
+        indexes = [
+            # Staff search (accounts:user_search) matches lowercased name prefixes; the Area
+            # filter is applied to the few matches
+            models.Index(Lower('last_name'), name='user_last_name_lower_idx'),
+            models.Index(Lower('first_name'), name='user_first_name_lower_idx'),
+            models.Index(Lower('nickname'), name='user_nickname_lower_idx'),
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+        ]
         verbose_name = 'User'
         verbose_name_plural = 'Users'
 
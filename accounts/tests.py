@@ -54,3 +54,47 @@ class SuperUserLoginSignalTest(TestCase):
 
         user.refresh_from_db()
         self.assertEqual(user.tier, 'regular')
+
+class UserSearchTest(TestCase):
+    def setUp(self):
+        from accounts.models import Area
+        self.area = Area.objects.create(name="North")
+        self.other_area = Area.objects.create(name="South")
+        self.sup = User.objects.create_user(username='sup', first_name='Sara', last_name='Sup', tier='supervisor', is_approved=True, area=self.area)
+        self.juan = User.objects.create_user(username='jdc', first_name='Juan', last_name='Dela Cruz', nickname='Jun', is_approved=True, area=self.area)
+        self.juana = User.objects.create_user(username='jana', first_name='Juana', last_name='Reyes', is_approved=True, area=self.other_area)
+        User.objects.create_user(username='pending', first_name='Juanito', last_name='Pending', is_approved=False, area=self.area)
+
+    def test_supervisor_searches_own_area(self):
+        self.client.force_login(self.sup)
+        results = self.client.get(reverse('accounts:user_search'), {'q': 'jua'}).json()['results']
+        self.assertEqual([r['id'] for r in results], [self.juan.id])
+
+    def test_words_and_nickname(self):
+        admin = User.objects.create_user(username='adm', first_name='Ad', last_name='Min', tier='administrator', is_approved=True)
+        self.client.force_login(admin)
+        search = lambda **params: [r['username'] for r in self.client.get(reverse('accounts:user_search'), params).json()['results']]
+        self.assertEqual(search(q='juan d'), ['jdc'])
+        self.assertEqual(search(q='jun'), ['jdc'])
+        self.assertEqual(search(q='jua'), ['jdc', 'jana'])
+        self.assertEqual(search(q='jua', area_id=self.other_area.id), ['jana'])
+        self.assertEqual(search(q=''), [])
+
+    def test_non_ascii_prefix(self):
+        User.objects.create_user(username='nun', first_name='Ñora', last_name='Ñuñez', is_approved=True, area=self.area)
+        self.client.force_login(self.sup)
+        search = lambda q: [r['username'] for r in self.client.get(reverse('accounts:user_search'), {'q': q}).json()['results']]
+        self.assertEqual(search('Ñu'), ['nun'])
+        self.assertEqual(search('ñu'), []) # SQLite's LOWER() keeps the case of Ñ
+
+    def test_search_uses_lower_indexes(self):
+        from django.db.models.functions import Lower
+        from accounts.views import USER_SEARCH_FIELDS, _prefix_q
+        users = User.objects.alias(**{f'{f}_lower': Lower(f) for f in USER_SEARCH_FIELDS})
+        plan = users.filter(_prefix_q('Jua')).explain()
+        for name in ['user_last_name_lower_idx', 'user_first_name_lower_idx', 'user_nickname_lower_idx', 'user_username_lower_idx']:
+            self.assertIn(name, plan)
+
+    def test_regular_staff_refused(self):
+        self.client.force_login(self.juan)
+        self.assertEqual(self.client.get(reverse('accounts:user_search'), {'q': 'j'}).status_code, 403)
@@ -10,5 +10,6 @@ urlpatterns = [
     path('approvals/', views.approvals, name='approvals'),
     path('settings/', views.account_settings, name='account_settings'),
     path('list/', views.account_list, name='account_list'),
+    path('search/', views.user_search, name='user_search'),
     path('promote/<int:user_id>/', views.account_promote, name='account_promote'),
 ]
@@ -4,8 +4,12 @@ from django.contrib import messages
 from .forms import UserRegistrationForm, AccountSettingsForm, UserPromotionForm, ForgotPasswordForm
 from django.contrib.auth.decorators import login_required
 from .models import User, PasswordResetRequest, AccountActionLog
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.hashers import make_password
+import string
 
 def register(request):
     if request.user.is_authenticated:
@@ -173,6 +177,63 @@ def account_list(request):
 
     return render(request, 'accounts/account_list.html', {'users': users})
 
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_FIELDS = ('first_name', 'last_name', 'nickname', 'username')
+
+# SQLite's LOWER() folds A-Z only, str.lower() all of Unicode
+_SQLITE_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def _db_lower(term):
+    """
+    term lowercased the way the database's LOWER() does it, so the bounds in _prefix_q
+    compare with the indexed values as stored: on SQLite "Ñu" stays "Ñu" and finds "Ñuñez".
+    """
+    if connection.vendor == 'sqlite':
+        return term.translate(_SQLITE_LOWER)
+    return term.lower()
+
+def _prefix_q(term):
+    """
+    Q for users with a USER_SEARCH_FIELDS value starting with term, ignoring case (ASCII case
+    only on SQLite, as its LIKE does). Written as ranges on the lowercased columns, which the
+    LOWER(...) indexes serve; SQLite cannot use them for LIKE/istartswith.
+    """
+    low = _db_lower(term)
+    high = low[:-1] + chr(ord(low[-1]) + 1)
+    q = Q()
+    for field in USER_SEARCH_FIELDS:
+        q |= Q(**{f'{field}_lower__gte': low, f'{field}_lower__lt': high})
+    return q
+
+@login_required
+def user_search(request):
+    """
+    Typeahead search of active staff by name, nickname or username prefix, as JSON.
+    Supervisors search their own Area; administrators all, or ?area_id= when given.
+    """
+    if not request.user.is_superuser and request.user.tier not in ['supervisor', 'administrator']:
+        return HttpResponseForbidden("You are not authorized to view this page.")
+
+    users = User.objects.filter(is_active=True, is_approved=True)
+    if request.user.tier == 'supervisor' and not request.user.is_superuser:
+        users = users.filter(area_id=request.user.area_id) if request.user.area_id else users.none()
+    elif request.GET.get('area_id', '').isdigit():
+        users = users.filter(area_id=request.GET['area_id'])
+
+    # Every word has to start one of the names: "juan d" finds Juan Dela Cruz
+    terms = request.GET.get('q', '').split()[:3]
+    if not terms:
+        return JsonResponse({'results': []})
+    users = users.alias(**{f'{field}_lower': Lower(field) for field in USER_SEARCH_FIELDS})
+    for term in terms:
+        users = users.filter(_prefix_q(term))
+
+    users = users.order_by('last_name', 'first_name').only('id', 'username', 'first_name', 'last_name', 'nickname')
+    return JsonResponse({'results': [
+        {'id': u.id, 'name': u.get_full_name(), 'username': u.username, 'short_name': u.get_short_name_for_schedule}
+        for u in users[:USER_SEARCH_LIMIT]
+    ]})
+
 @login_required
 def account_promote(request, user_id):
     if not request.user.is_superuser and request.user.tier not in ['supervisor', 'administrator']:
@@ -0,0 +1,118 @@
+"""
+Server clock offset against NTP.
+
+Time-in and time-out use NTP time, but asking an NTP server on every request blocks the
+request for a network round trip. Instead the offset between the system clock and NTP is
+measured periodically (the sync_clock management command, or with CLOCK_SYNC_IN_PROCESS a
+daemon thread started on first use) and stored in the ClockOffset row, which every process
+reads through its cache for OFFSET_CACHE_TIMEOUT; now() adds it to timezone.now().
+"""
+import datetime
+import logging
+import threading
+import time
+import ntplib
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import ClockOffset
+
+OFFSET_KEY = 'clock:offset'
+OFFSET_CACHE_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+_sync_thread = None
+_sync_lock = threading.Lock()
+
+
+def _server_address(server):
+    host, _, port = server.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return server, 'ntp'
+
+
+def measure_offset(servers=None, timeout=2):
+    """
+    (offset in seconds, server) from the first of the servers that answers, or None.
+    """
+    client = ntplib.NTPClient()
+    for server in servers or settings.CLOCK_SYNC_SERVERS:
+        host, port = _server_address(server)
+        try:
+            response = client.request(host, version=3, port=port, timeout=timeout)
+        except (ntplib.NTPException, OSError):
+            continue
+        return response.offset, server
+    return None
+
+
+def sync_clock(servers=None, timeout=2):
+    """
+    Measures the offset and stores it for now(). Returns what measure_offset returned.
+    """
+    result = measure_offset(servers, timeout)
+    if result:
+        offset, server = result
+        ClockOffset.objects.update_or_create(pk=1, defaults={
+            'offset_us': round(offset * 1_000_000),
+            'server': server,
+            'measured_at': timezone.now(),
+        })
+        cache.delete(OFFSET_KEY)
+    return result
+
+
+def get_offset():
+    """
+    The last stored measurement ({'offset_us', 'server', 'measured_at'}) if younger than
+    CLOCK_SYNC_MAX_AGE, or None.
+    """
+    state = cache.get(OFFSET_KEY)
+    if state is None:
+        row = ClockOffset.objects.filter(pk=1).values('offset_us', 'server', 'measured_at').first()
+        state = row or {} # {}: nothing measured yet, cached too
+        cache.set(OFFSET_KEY, state, OFFSET_CACHE_TIMEOUT)
+    if not state or timezone.now() - state['measured_at'] > datetime.timedelta(seconds=settings.CLOCK_SYNC_MAX_AGE):
+        return None
+    return state
+
+
+def _sync_forever():
+    global _sync_thread
+    try:
+        while True:
+            try:
+                sync_clock()
+            except Exception:
+                # Keep measuring; until the next success now() uses the stored or system clock
+                logger.exception("Clock sync failed")
+            time.sleep(settings.CLOCK_SYNC_INTERVAL)
+    finally:
+        # Lets the next now() start a new thread should this one ever end
+        with _sync_lock:
+            _sync_thread = None
+
+
+def start_background_sync():
+    """
+    Starts the measuring thread of this process, once.
+    """
+    global _sync_thread
+    with _sync_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_forever, name='clock-sync', daemon=True)
+            _sync_thread.start()
+
+
+def now():
+    """
+    timezone.now() corrected by the stored NTP offset (the system clock until one is measured).
+    """
+    if settings.CLOCK_SYNC_IN_PROCESS and _sync_thread is None:
+        start_background_sync()
+    state = get_offset()
+    if state is None:
+        return timezone.now()
+    return timezone.now() + datetime.timedelta(microseconds=state['offset_us'])
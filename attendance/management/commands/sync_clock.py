@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import time
+from attendance.clock import sync_clock
+
+
+class Command(BaseCommand):
+    help = 'Measures the clock offset against the NTP servers and stores it in the database for the time-in/out of every web process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', dest='servers', help='NTP server ("host" or "host:port"); repeatable. Defaults to CLOCK_SYNC_SERVERS.')
+        parser.add_argument('--loop', action='store_true', help='Keep measuring every CLOCK_SYNC_INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            result = sync_clock(options['servers'])
+            if result:
+                offset, server = result
+                self.stdout.write(f"Offset {offset * 1000:+.1f} ms from {server}")
+            elif not options['loop']:
+                raise CommandError("No NTP server answered.")
+            else:
+                self.stderr.write("No NTP server answered.")
+            if not options['loop']:
+                return
+            time.sleep(settings.CLOCK_SYNC_INTERVAL)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 15:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0004_shop_area"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="timelog",
+            index=models.Index(fields=["date", "shop"], name="timelog_date_shop_idx"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0005_timelog_date_shop_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClockOffset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("server", models.CharField(max_length=255)),
+                ("offset_us", models.BigIntegerField()),
+                ("measured_at", models.DateTimeField()),
+            ],
+        ),
+    ]
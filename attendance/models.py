@@ -1,4 +1,5 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import models, connections, transaction, IntegrityError
 from django.conf import settings
 from django.utils import timezone
 
@@ -30,6 +31,45 @@ class ShopOperatingHours(models.Model):
         unique_together = ('shop', 'day')
         ordering = ['day']
 
+class TimeLogQuerySet(models.QuerySet):
+    def punch_in(self, user, shop, date, time_in):
+        """
+        Inserts the user's TimeLog of the day unless there already is one, as one statement
+        (INSERT ... ON CONFLICT DO NOTHING). Returns True if this call created it.
+        """
+        connection = connections[self.db]
+        if connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert:
+            opts = self.model._meta
+            qn = connection.ops.quote_name
+            user_col, shop_col, date_col, time_col = (qn(opts.get_field(f).column) for f in ('user', 'shop', 'date', 'time_in'))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {qn(opts.db_table)} ({user_col}, {shop_col}, {date_col}, {time_col}) VALUES (%s, %s, %s, %s) "
+                    f"ON CONFLICT ({user_col}, {date_col}) DO NOTHING RETURNING {qn(opts.pk.column)}",
+                    [user.pk, shop.pk, connection.ops.adapt_datefield_value(date), connection.ops.adapt_timefield_value(time_in)],
+                )
+                return cursor.fetchone() is not None
+        # Other backends: the unique (user, date) constraint decides
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(user=user, shop=shop, date=date, time_in=time_in)
+        except IntegrityError:
+            return False
+        return True
+
+    def punch_out(self, user, date, time_out):
+        """
+        Sets the time-out of the user's TimeLog of the day if it has none yet, as one
+        conditional UPDATE. Returns True if this call set it.
+        """
+        return self.filter(user=user, date=date, time_out__isnull=True).update(time_out=time_out) == 1
+
+    async def apunch_in(self, user, shop, date, time_in):
+        return await sync_to_async(self.punch_in)(user, shop, date, time_in)
+
+    async def apunch_out(self, user, date, time_out):
+        return await self.filter(user=user, date=date, time_out__isnull=True).aupdate(time_out=time_out) == 1
+
 class TimeLog(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='time_logs')
     shop = models.ForeignKey(Shop, on_delete=models.SET_NULL, null=True)
@@ -38,9 +78,29 @@ class TimeLog(models.Model):
     time_out = models.TimeField(null=True, blank=True)
     remarks = models.TextField(blank=True, null=True, help_text="Stores manual override history and remarks.")
 
+    # Time-in/out go through punch_in/punch_out; they bypass save(), so no post_save is sent
+    objects = TimeLogQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'date') # One log per user per day as per implication of "Time-In button... record it as employee's time-in for the day"
         ordering = ['-date']
+        indexes = [
+            # Schedule grids read a week of logs for an Area's shops
+            models.Index(fields=['date', 'shop'], name='timelog_date_shop_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.date}"
+
+class ClockOffset(models.Model):
+    """
+    The last NTP measurement of the server clock (attendance.clock), a single row. Kept here
+    rather than in the cache so a measurement by the sync_clock command reaches every web
+    process.
+    """
+    server = models.CharField(max_length=255)
+    offset_us = models.BigIntegerField()
+    measured_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.offset_us / 1000:+.1f} ms from {self.server}"
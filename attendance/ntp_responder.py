@@ -0,0 +1,61 @@
+"""
+Local stand-in NTP server, so clock sync can be exercised without network access.
+
+    with LocalNTPResponder(skew=2.5) as responder:
+        sync_clock([responder.address])
+"""
+import socket
+import threading
+import time
+import ntplib
+
+
+class LocalNTPResponder:
+    """
+    Answers NTP client requests on 127.0.0.1 with the system time shifted by skew seconds.
+    """
+    def __init__(self, skew=0.0, port=0):
+        self.skew = skew
+        self.requests = 0
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(('127.0.0.1', port))
+        self._socket.settimeout(0.2)
+        host, port = self._socket.getsockname()
+        self.address = f'{host}:{port}'
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name='ntp-responder', daemon=True)
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                data, client = self._socket.recvfrom(256)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            received = ntplib.system_to_ntp_time(time.time() + self.skew)
+            query = ntplib.NTPPacket()
+            query.from_data(data)
+
+            reply = ntplib.NTPPacket(version=query.version, mode=4)
+            reply.stratum = 2
+            reply.orig_timestamp = query.tx_timestamp
+            reply.recv_timestamp = received
+            reply.tx_timestamp = ntplib.system_to_ntp_time(time.time() + self.skew)
+            self._socket.sendto(reply.to_data(), client)
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,8 +1,10 @@
 
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, Client
 from accounts.models import User
 from attendance.models import Shop, ShopOperatingHours
 import datetime
+import threading
 
 class ShopManageTests(TestCase):
     def setUp(self):
@@ -91,3 +93,175 @@ class ShopManageTests(TestCase):
         shop = Shop.objects.get(name='New Shop')
         self.assertEqual(shop.operating_hours.count(), 1)
         self.assertEqual(shop.operating_hours.first().day, 0)
+
+
+class ClockSyncTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_offset_from_local_responder(self):
+        from django.utils import timezone
+        from attendance.clock import sync_clock, now
+        from attendance.ntp_responder import LocalNTPResponder
+
+        with LocalNTPResponder(skew=2.5) as responder:
+            offset, server = sync_clock([responder.address])
+        self.assertEqual(server, responder.address)
+        self.assertAlmostEqual(offset, 2.5, delta=0.05)
+        self.assertAlmostEqual((now() - timezone.now()).total_seconds(), 2.5, delta=0.05)
+
+    def test_falls_through_to_next_server(self):
+        from attendance.clock import measure_offset
+        from attendance.ntp_responder import LocalNTPResponder
+
+        with LocalNTPResponder() as silent:
+            pass # Stopped: nobody answers there
+        with LocalNTPResponder(skew=-1.0) as responder:
+            offset, server = measure_offset([silent.address, responder.address], timeout=0.2)
+        self.assertEqual(server, responder.address)
+        self.assertAlmostEqual(offset, -1.0, delta=0.05)
+
+    def test_no_measurement_uses_system_clock(self):
+        from django.utils import timezone
+        from attendance.clock import sync_clock, now
+        from attendance.ntp_responder import LocalNTPResponder
+
+        with LocalNTPResponder() as responder:
+            pass
+        self.assertIsNone(sync_clock([responder.address], timeout=0.2))
+        self.assertAlmostEqual((now() - timezone.now()).total_seconds(), 0, delta=0.05)
+
+    def test_sync_thread_survives_failures(self):
+        from unittest import mock
+        from attendance import clock
+
+        class Stop(BaseException):
+            pass
+
+        clock._sync_thread = 'running' # As set by start_background_sync
+        with mock.patch.object(clock, 'measure_offset', side_effect=[OSError("unreachable"), (0.5, 'test')]), \
+                mock.patch.object(clock.time, 'sleep', side_effect=[None, Stop()]), \
+                self.assertLogs('attendance.clock', 'ERROR'):
+            with self.assertRaises(Stop):
+                clock._sync_forever()
+        self.assertEqual(clock.get_offset()['offset_us'], 500_000)
+        self.assertIsNone(clock._sync_thread)
+
+    def test_command_offset_reaches_other_processes(self):
+        from io import StringIO
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from django.utils import timezone
+        from attendance.clock import now
+        from attendance.ntp_responder import LocalNTPResponder
+
+        with LocalNTPResponder(skew=2.5) as responder:
+            call_command('sync_clock', server=[responder.address], stdout=StringIO())
+        cache.clear() # A web process: its cache never saw the command's measurement
+        self.assertAlmostEqual((now() - timezone.now()).total_seconds(), 2.5, delta=0.05)
+
+    def test_stale_offset_ignored(self):
+        from django.utils import timezone
+        from attendance.clock import now
+        from attendance.models import ClockOffset
+        measured_at = timezone.now() - datetime.timedelta(seconds=settings.CLOCK_SYNC_MAX_AGE + 1)
+        ClockOffset.objects.create(pk=1, offset_us=3_600_000_000, server='test', measured_at=measured_at)
+        self.assertAlmostEqual((now() - timezone.now()).total_seconds(), 0, delta=0.05)
+
+    def test_home_uses_stored_offset_without_network(self):
+        from django.utils import timezone
+        from attendance.models import ClockOffset
+        user = User.objects.create_user(username='clock', first_name='Clock', last_name='User', password='password', tier='supervisor', is_approved=True)
+        self.client.login(username='clock', password='password')
+        ClockOffset.objects.create(pk=1, offset_us=3_600_000_000, server='test', measured_at=timezone.now())
+
+        response = self.client.get('/attendance/')
+        drift = response.context['current_time'] - timezone.now()
+        self.assertAlmostEqual(drift.total_seconds(), 3600, delta=5)
+
+
+class PunchEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='puncher', first_name='Punch', last_name='Er', password='password', is_approved=True)
+        self.shop = Shop.objects.create(name='Punch Shop', is_active=True)
+        self.user.applicable_shops.add(self.shop)
+
+    async def test_time_in_then_out(self):
+        from django.utils import timezone
+        from attendance.models import TimeLog
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_in', 'shop_id': self.shop.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['shop'], 'Punch Shop')
+
+        again = await self.async_client.post('/attendance/punch/', {'action': 'time_in', 'shop_id': self.shop.id})
+        self.assertEqual(again.status_code, 409)
+
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_out'})
+        self.assertEqual(response.json()['action'], 'time_out')
+        log = await TimeLog.objects.aget(user=self.user, date=timezone.localdate())
+        self.assertEqual(log.shop_id, self.shop.id)
+        self.assertIsNotNone(log.time_out)
+
+        again = await self.async_client.post('/attendance/punch/', {'action': 'time_out'})
+        self.assertEqual(again.status_code, 409)
+
+    async def test_rejects_bad_requests(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_out'})
+        self.assertEqual(response.status_code, 409)
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_in', 'shop_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/attendance/punch/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_only_own_shops(self):
+        other = await Shop.objects.acreate(name='Other Shop', is_active=True)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_in', 'shop_id': other.id})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_repeat_time_in_reported_before_shop_check(self):
+        from django.utils import timezone
+        from attendance.models import TimeLog
+        await TimeLog.objects.acreate(user=self.user, shop=self.shop, date=timezone.localdate(), time_in=datetime.time(9, 0))
+        await self.async_client.aforce_login(self.user)
+        # A double tap after the shop list changed still hears it already counted
+        response = await self.async_client.post('/attendance/punch/', {'action': 'time_in', 'shop_id': 'x'})
+        self.assertEqual(response.status_code, 409)
+
+
+class ConcurrentPunchTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='racer', first_name='Race', last_name='Er', password='password', is_approved=True)
+        self.shop = Shop.objects.create(name='Race Shop', is_active=True)
+
+    def _race(self, punch, threads=8):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection
+        barrier = threading.Barrier(threads)
+
+        def run(_):
+            try:
+                barrier.wait()
+                return punch()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(threads) as pool:
+            return list(pool.map(run, range(threads)))
+
+    def test_one_time_in_and_one_time_out_win(self):
+        from attendance.models import TimeLog
+        today = datetime.date(2026, 10, 19)
+
+        results = self._race(lambda: TimeLog.objects.punch_in(self.user, self.shop, today, datetime.time(8, 0)))
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(TimeLog.objects.filter(user=self.user, date=today).count(), 1)
+
+        results = self._race(lambda: TimeLog.objects.punch_out(self.user, today, datetime.time(17, 0)))
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(TimeLog.objects.get(user=self.user, date=today).time_out, datetime.time(17, 0))
+        self.assertFalse(TimeLog.objects.punch_out(self.user, today, datetime.time(18, 0)))
@@ -5,6 +5,7 @@ app_name = 'attendance'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('punch/', views.punch, name='punch'),
     path('shops/', views.shop_list, name='shop_list'),
     path('shops/create/', views.shop_manage, name='shop_create'),
     path('shops/edit/<int:shop_id>/', views.shop_manage, name='shop_edit'),
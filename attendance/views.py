@@ -1,43 +1,48 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from .models import Shop, TimeLog, ShopOperatingHours
-from scheduling.models import ShopRequirement, Schedule
+from scheduling.models import ShopRequirement, Schedule, Shift
+from scheduling.grid import bump_grid_version, week_start_for
 from .forms import ShopForm, ShopRequirementForm, ShopOperatingHoursForm
 from .forms_edit import TimeLogEditForm
 from django.forms import inlineformset_factory
-from django.http import HttpResponseForbidden
-import ntplib
-from time import ctime
+from django.db.models import Q
+from django.http import HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_POST
+from . import clock
 import datetime
-import requests
 
 def get_ntp_time():
     """
-    Fetches time from ntp.pagasa.dost.gov.ph or fallbacks.
+    Current time corrected by the last measured NTP offset (see attendance.clock), in the
+    current timezone. Never waits on the network.
     """
-    try:
-        client = ntplib.NTPClient()
-        response = client.request('ntp.pagasa.dost.gov.ph', version=3)
-        return datetime.datetime.fromtimestamp(response.tx_time, tz=timezone.get_current_timezone())
-    except Exception as e:
-        # Fallback to WorldTimeAPI or System Time if NTP fails
-        try:
-            r = requests.get('http://worldtimeapi.org/api/timezone/Asia/Manila', timeout=2)
-            if r.status_code == 200:
-                data = r.json()
-                # Parse ISO format
-                return datetime.datetime.fromisoformat(data['datetime'])
-        except:
-            pass
-        return timezone.now()
+    return timezone.localtime(clock.now())
+
+def _punch_shops(user, today):
+    """
+    Shops the user may time in at: all active shops for supervisors and administrators;
+    for regular staff, their applicable shops plus the shops of their shifts in this and
+    next week's published schedules. Lazy, so async views can evaluate it with afirst().
+    """
+    if user.tier != 'regular':
+        return Shop.objects.filter(is_active=True)
+
+    start_of_week = today - datetime.timedelta(days=today.weekday())
+    assigned = Shift.objects.filter(
+        user=user, schedule__is_published=True,
+        schedule__week_start_date__in=[start_of_week, start_of_week + datetime.timedelta(days=7)],
+    ).values('shop_id')
+    return Shop.objects.filter(Q(applicable_staff=user) | Q(id__in=assigned), is_active=True).distinct()
 
 @login_required
 def home(request):
     current_time = get_ntp_time()
-    today = timezone.localdate()
+    today = current_time.date() # The NTP-corrected day, not the system clock's
 
     # Check if user already timed in today
     try:
@@ -45,64 +50,36 @@ def home(request):
     except TimeLog.DoesNotExist:
         todays_log = None
 
-    if request.user.tier == 'regular':
-        # Default applicable shops
-        applicable = request.user.applicable_shops.filter(is_active=True)
-
-        # Shops assigned in current and next week's published schedules
-        start_of_week = today - datetime.timedelta(days=today.weekday())
-        start_of_next_week = start_of_week + datetime.timedelta(days=7)
-
-        # Use week_start_date__gte to catch future weeks too, or specific check
-        schedules = Schedule.objects.filter(
-            week_start_date__in=[start_of_week, start_of_next_week],
-            is_published=True
-        )
-
-        assigned_shop_ids = set()
-        for sch in schedules:
-            # Find shifts for this user in these schedules
-            shifts = sch.shifts.filter(user=request.user)
-            for s in shifts:
-                assigned_shop_ids.add(s.shop.id)
-
-        if assigned_shop_ids:
-            assigned_shops = Shop.objects.filter(id__in=assigned_shop_ids, is_active=True)
-            shops = (applicable | assigned_shops).distinct()
-        else:
-            shops = applicable
-    else:
-        shops = Shop.objects.filter(is_active=True)
+    shops = _punch_shops(request.user, today)
 
     if request.method == 'POST':
         action = request.POST.get('action')
 
+        # Single-statement writes: double taps and second devices cannot race into a 500
         if action == 'time_in':
+            shop_id = request.POST.get('shop_id', '')
+            shop = shops.filter(id=shop_id).first() if shop_id.isdigit() and not todays_log else None
             if todays_log:
+                # A second tap: no need to check the shop
                 messages.warning(request, "You have already timed in today.")
+            elif shop is None:
+                messages.error(request, "Please select a shop.")
+            elif TimeLog.objects.punch_in(request.user, shop, today, current_time.time()):
+                bump_grid_version(week_start_for(today))
+                messages.success(request, f"Timed in at {current_time.strftime('%I:%M %p')} for {shop.name}.")
+                return redirect('attendance:home')
             else:
-                shop_id = request.POST.get('shop_id')
-                if not shop_id:
-                    messages.error(request, "Please select a shop.")
-                else:
-                    shop = Shop.objects.get(id=shop_id)
-                    TimeLog.objects.create(
-                        user=request.user,
-                        shop=shop,
-                        date=today,
-                        time_in=current_time.time()
-                    )
-                    messages.success(request, f"Timed in at {current_time.strftime('%I:%M %p')} for {shop.name}.")
-                    return redirect('attendance:home')
+                messages.warning(request, "You have already timed in today.")
 
         elif action == 'time_out':
-            if not todays_log:
-                messages.error(request, "You haven't timed in yet.")
-            else:
-                todays_log.time_out = current_time.time()
-                todays_log.save()
+            if TimeLog.objects.punch_out(request.user, today, current_time.time()):
+                bump_grid_version(week_start_for(today))
                 messages.success(request, f"Timed out at {current_time.strftime('%I:%M %p')}.")
                 return redirect('attendance:home')
+            if todays_log:
+                messages.warning(request, "You have already timed out today.")
+            else:
+                messages.error(request, "You haven't timed in yet.")
 
     # Fetch today's logs for display, excluding Roving
     todays_logs_list = TimeLog.objects.filter(date=today).exclude(shop__name='Roving').select_related('user', 'shop').order_by('time_in')
@@ -114,6 +91,42 @@ def home(request):
         'todays_logs_list': todays_logs_list,
     })
 
+@login_required
+@require_POST
+async def punch(request):
+    """
+    Async time-in/time-out for clock-in bursts (serve through hris_project.asgi): resolves the
+    time, answers repeated time-ins before checking the shop against _punch_shops, and writes
+    the TimeLog in one statement, answering with small JSON.
+    POST action=time_in&shop_id=<id> or action=time_out.
+    """
+    user = await request.auser()
+    current_time = get_ntp_time()
+    today = current_time.date()
+    action = request.POST.get('action')
+
+    if action == 'time_in':
+        if await TimeLog.objects.filter(user=user, date=today).aexists():
+            return JsonResponse({'ok': False, 'error': "You have already timed in today."}, status=409)
+        shop_id = request.POST.get('shop_id', '')
+        shop = None
+        if shop_id.isdigit():
+            shop = await _punch_shops(user, today).filter(id=shop_id).only('id', 'name').afirst()
+        if shop is None:
+            return JsonResponse({'ok': False, 'error': "Please select a shop."}, status=400)
+        if not await TimeLog.objects.apunch_in(user, shop, today, current_time.time()):
+            return JsonResponse({'ok': False, 'error': "You have already timed in today."}, status=409)
+        await sync_to_async(bump_grid_version)(week_start_for(today)) # The insert sends no post_save
+        return JsonResponse({'ok': True, 'action': action, 'time': current_time.strftime('%H:%M:%S'), 'shop': shop.name})
+
+    if action == 'time_out':
+        if not await TimeLog.objects.apunch_out(user, today, current_time.time()):
+            return JsonResponse({'ok': False, 'error': "Not timed in, or already timed out today."}, status=409)
+        await sync_to_async(bump_grid_version)(week_start_for(today)) # update() sends no post_save
+        return JsonResponse({'ok': True, 'action': action, 'time': current_time.strftime('%H:%M:%S')})
+
+    return JsonResponse({'ok': False, 'error': "Unknown action."}, status=400)
+
 @login_required
 def shop_list(request):
     if request.user.tier not in ['supervisor', 'administrator']:
@@ -2,6 +2,8 @@
 ASGI config for hris_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server (e.g. ``uvicorn hris_project.asgi:application``) to let
+async views such as attendance.views.punch absorb bursts without a thread per request.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
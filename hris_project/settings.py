@@ -77,6 +77,22 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Writers wait this long for the write lock instead of failing with "database is
+            # locked" (auto_generate_schedule takes it at BEGIN for each Area's transaction).
+            "timeout": 20,
+        },
+    }
+}
+
+# Cached schedule grids and calendar feeds (scheduling.grid, scheduling.ical). The local-memory
+# cache is per process, but entries are keyed by version counters kept in the database
+# (scheduling.versions), so writes from any process invalidate them everywhere. A shared
+# backend (Redis, Memcached) only saves each worker its own rebuilds.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "hris-default",
     }
 }
 
@@ -135,3 +151,13 @@ LOGIN_URL = 'login'
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+
+# Clock sync (attendance.clock): NTP servers tried in order ("host" or "host:port"), how often
+# the offset is measured, and how long a measurement is trusted before falling back to the
+# system clock. Run "manage.py sync_clock --loop" next to the web processes (they read its
+# measurement from the database), or set CLOCK_SYNC_IN_PROCESS to measure from a thread in
+# each process.
+CLOCK_SYNC_SERVERS = ['ntp.pagasa.dost.gov.ph']
+CLOCK_SYNC_INTERVAL = 300
+CLOCK_SYNC_MAX_AGE = 3600
+CLOCK_SYNC_IN_PROCESS = False
@@ -62,11 +62,11 @@ class HRISTest(TestCase):
         log = TimeLog.objects.get(user=self.user)
         t1 = log.time_out
 
-        # Time out 2 (Later) - mocking time passage is hard in integration test without freezing time,
-        # but we can check that it allows updates.
+        # Time out 2 - the first time-out stands
         self.client.post('/attendance/home/', {'action': 'time_out'})
         log.refresh_from_db()
         self.assertIsNotNone(log.time_out)
+        self.assertEqual(log.time_out, t1)
 
     def test_scheduling_access(self):
         self.client.login(username='testuser', password='password123')
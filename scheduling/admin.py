@@ -1,3 +1,18 @@
 from django.contrib import admin
+from .models import ScoringRule, GenerationRun, ScoreEvent
 
-# Register your models here.
+@admin.register(ScoringRule)
+class ScoringRuleAdmin(admin.ModelAdmin):
+    list_display = ('code', 'area', 'weight')
+    list_filter = ('area',)
+
+@admin.register(GenerationRun)
+class GenerationRunAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'area', 'mode', 'week_count', 'user_count', 'shop_count', 'total_ms', 'total_queries')
+    list_filter = ('area', 'mode')
+
+@admin.register(ScoreEvent)
+class ScoreEventAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user', 'shop', 'delta', 'reason')
+    list_filter = ('reason', 'shop')
+    date_hierarchy = 'date'
@@ -18,3 +18,5 @@ class ShiftAddForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['user'].queryset = User.objects.filter(is_active=True, is_approved=True)
+        # Picked with the staff search (accounts:user_search), so no option list is rendered
+        self.fields['user'].widget = forms.HiddenInput()
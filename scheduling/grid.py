@@ -0,0 +1,326 @@
+"""
+Cached schedule grid read model.
+
+The grid of a schedule (shifts per date and shop, with attendance status) is the same for
+every viewer of the same shops, so it is built once and kept in Django's cache. Entries are
+keyed by a per-week version counter (scheduling.versions, kept in the database) that the
+Shift, TimeLog and ScheduleChangeLog signals bump once per transaction (see
+scheduling.signals), so a write in any process makes the next view rebuild. Viewer-specific
+parts (edit links, today's highlighting) stay in the templates.
+"""
+import datetime
+import hashlib
+import time
+from django.core.cache import cache
+from django.db.models import Count, Q
+from accounts.models import User
+from attendance.models import TimeLog
+from .models import Shift
+from .reconciliation import reconcile_week
+from .versions import get_version, bump_version, bump_version_on_commit
+
+GRID_CACHE_TIMEOUT = 60 * 60 # Also bounds staleness from writes without signals (e.g. renamed users)
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7 # Past weeks only change through (versioned) edits
+STATS_KEY = 'schedule_grid:stats'
+
+# User columns behind get_short_name_for_schedule and get_full_name
+GRID_USER_FIELDS = ('user__username', 'user__first_name', 'user__last_name', 'user__nickname')
+
+
+def week_start_for(date):
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def _version_key(week_start_date):
+    return f'schedule_grid:{week_start_date}'
+
+
+def get_grid_version(week_start_date):
+    return get_version(_version_key(week_start_date))
+
+
+def bump_grid_version(week_start_date):
+    bump_version(_version_key(week_start_date))
+
+
+def bump_grid_version_on_commit(week_start_date):
+    bump_version_on_commit(_version_key(week_start_date))
+
+
+def _incr(name, delta=1):
+    key = f'{STATS_KEY}:{name}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta) # Atomic, unlike get-then-set
+    except ValueError:
+        cache.set(key, delta, None) # Evicted since the add
+
+
+def _record(hit, rebuild_us=0):
+    if hit:
+        _incr('hits')
+    else:
+        _incr('misses')
+        _incr('rebuild_us', rebuild_us)
+        cache.set(f'{STATS_KEY}:last_rebuild_us', rebuild_us, None)
+
+
+def grid_cache_stats():
+    """
+    Hit/miss counts, hit ratio and rebuild times (ms) of the grid cache of this process:
+    LocMemCache is per process, and so are these counters.
+    """
+    names = ('hits', 'misses', 'rebuild_us', 'last_rebuild_us')
+    values = cache.get_many([f'{STATS_KEY}:{name}' for name in names])
+    hits, misses, rebuild_us, last_rebuild_us = (values.get(f'{STATS_KEY}:{name}', 0) for name in names)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else 0.0,
+        'rebuild_ms': rebuild_us / 1000,
+        'avg_rebuild_ms': rebuild_us / misses / 1000 if misses else 0.0,
+        'last_rebuild_ms': last_rebuild_us / 1000,
+    }
+
+
+def _shops_key(shops):
+    return hashlib.md5(','.join(str(s.id) for s in shops).encode()).hexdigest()
+
+
+def get_schedule_grid(schedule, shops, today):
+    """
+    Returns {'dates': [...], 'matrix': {date: {shop_id: {'main': [...], 'backup': [...]}}}}
+    for the schedule and shop columns, from the cache when the week has not changed.
+    """
+    version = get_grid_version(schedule.week_start_date)
+    # today is part of the key: absent/ongoing depend on it
+    key = f'schedule_grid:{schedule.id}:{_shops_key(shops)}:{today}:{version}'
+
+    grid = cache.get(key)
+    if grid is not None:
+        _record(hit=True)
+        return grid
+
+    started = time.perf_counter()
+    grid = build_schedule_grid(schedule, shops, today)
+    cache.set(key, grid, GRID_CACHE_TIMEOUT)
+    _record(hit=False, rebuild_us=round((time.perf_counter() - started) * 1_000_000))
+    return grid
+
+
+def grid_fragment_key(schedule, shops, scope):
+    """
+    Cache key of the rendered grid HTML of a published past week. scope names what the
+    viewer may see ('all' or the Area); the shop names are included since they are rendered.
+    """
+    shops_key = hashlib.md5('|'.join(f'{s.id}:{s.name}' for s in shops).encode()).hexdigest()
+    version = get_grid_version(schedule.week_start_date)
+    return f'schedule_grid_html:{schedule.id}:{scope}:{shops_key}:{version}'
+
+
+def summarize_grid(matrix, today):
+    """
+    Per-week stats of a grid: duty shifts, absences (the assigned staff did not report,
+    substituted or not), substitutions, supplements, and coverage: the share of duty shifts
+    already due that someone worked, in percent (None before the first day is over).
+    """
+    stats = {'duty_shifts': 0, 'due': 0, 'absences': 0, 'substitutions': 0, 'supplements': 0}
+    for d, cells in matrix.items():
+        for cell in cells.values():
+            for record in cell['main']:
+                if record.role == 'supplement':
+                    stats['supplements'] += 1
+                    continue
+                stats['duty_shifts'] += 1
+                if d < today:
+                    stats['due'] += 1
+                if record.status in ('absent', 'substituted'):
+                    stats['absences'] += 1
+                if record.status == 'substituted':
+                    stats['substitutions'] += 1
+    uncovered = stats['absences'] - stats['substitutions']
+    stats['coverage'] = round(100.0 * (stats['due'] - uncovered) / stats['due'], 1) if stats['due'] else None
+    return stats
+
+
+def get_week_stats(schedule, shops, today):
+    """
+    summarize_grid of the schedule for the shops, cached like the grid. A week that is over
+    keeps its stats until the week's version changes.
+    """
+    is_past = schedule.week_start_date + datetime.timedelta(days=6) < today
+    version = get_grid_version(schedule.week_start_date)
+    key = f'schedule_stats:{schedule.id}:{_shops_key(shops)}:{"past" if is_past else today}:{version}'
+    stats = cache.get(key)
+    if stats is None:
+        grid = get_schedule_grid(schedule, shops, today)
+        stats = summarize_grid(grid['matrix'], today)
+        cache.set(key, stats, FRAGMENT_CACHE_TIMEOUT if is_past else GRID_CACHE_TIMEOUT)
+    return stats
+
+
+def build_schedule_grid(schedule, shops, today):
+    dates = [schedule.week_start_date + datetime.timedelta(days=i) for i in range(7)]
+    shop_ids = [s.id for s in shops]
+
+    # Only the visible shops, and only the columns the grid shows
+    shifts = Shift.objects.filter(schedule=schedule, shop_id__in=shop_ids).select_related('user').only(
+        'id', 'date', 'shop_id', 'user_id', 'role', *GRID_USER_FIELDS
+    )
+    logs = TimeLog.objects.filter(date__range=[dates[0], dates[-1]], shop_id__in=shop_ids).select_related('user').only(
+        'date', 'shop_id', 'user_id', 'time_in', 'time_out', *GRID_USER_FIELDS
+    ).order_by('id') # Punch order decides who substitutes first
+    return {'dates': dates, 'matrix': reconcile_week(dates, shops, shifts, logs, today)}
+
+
+# Row view-models: the templates only loop over these, with every per-cell decision
+# (Roving layout, editability, counts, URLs) made once in the view.
+
+class ShopColumn:
+    __slots__ = ('shop', 'is_roving')
+
+    def __init__(self, shop):
+        self.shop = shop
+        self.is_roving = shop.name == 'Roving'
+
+
+class GridCell:
+    __slots__ = ('shop', 'is_roving', 'main', 'backup', 'add_main_url', 'add_backup_url')
+
+    def __init__(self, column, entries):
+        self.shop = column.shop
+        self.is_roving = column.is_roving
+        self.main = entries['main']
+        self.backup = entries['backup']
+        self.add_main_url = ''
+        self.add_backup_url = ''
+
+
+class DateRow:
+    __slots__ = ('date', 'cells', 'editable')
+
+    def __init__(self, date, cells, editable=False):
+        self.date = date
+        self.cells = cells
+        self.editable = editable
+
+
+class ShopRow:
+    __slots__ = ('shop', 'is_roving', 'main', 'backup')
+
+    def __init__(self, column, main, backup):
+        self.shop = column.shop
+        self.is_roving = column.is_roving
+        self.main = main # One entry list per date
+        self.backup = backup
+
+
+def shop_columns(shops):
+    return [ShopColumn(s) for s in shops]
+
+
+def date_rows(dates, columns, matrix, editable_after=None):
+    """
+    One row per date, one cell per shop column. Rows after editable_after (a date) are
+    flagged editable; None means the viewer cannot edit.
+    """
+    rows = []
+    for d in dates:
+        cells = matrix[d]
+        editable = editable_after is not None and d > editable_after
+        rows.append(DateRow(d, [GridCell(c, cells[c.shop.id]) for c in columns], editable))
+    return rows
+
+
+def shop_rows(dates, columns, matrix):
+    """
+    One row per shop, with the entries of each date in order (the history layout).
+    """
+    return [
+        ShopRow(c, [matrix[d][c.shop.id]['main'] for d in dates], [matrix[d][c.shop.id]['backup'] for d in dates])
+        for c in columns
+    ]
+
+
+def compact_grid(dates, shops, matrix, user_id=None, date_from=None, date_to=None):
+    """
+    Columnar form of a grid for the JSON API. Users, shops, roles and statuses are listed
+    once; each row is [day, shop, user, role, status, actual_user, shift_id] with day the
+    offset from the first date and the rest indexes into those lists (actual_user is None
+    when nobody reported). With user_id, only rows the user was assigned to or worked.
+    """
+    users, user_index = [], {}
+    roles, statuses = [], []
+
+    def index_of(value, values):
+        if value not in values:
+            values.append(value)
+        return values.index(value)
+
+    def user_of(user):
+        if user is None:
+            return None
+        if user.id not in user_index:
+            user_index[user.id] = len(users)
+            users.append([user.id, user.get_short_name_for_schedule, user.get_full_name()])
+        return user_index[user.id]
+
+    rows = []
+    for day, d in enumerate(dates):
+        if (date_from and d < date_from) or (date_to and d > date_to):
+            continue
+        for shop_idx, shop in enumerate(shops):
+            cell = matrix[d][shop.id]
+            for record in cell['main'] + cell['backup']:
+                actual = record.actual_user
+                if user_id is not None and record.user.id != user_id and (actual is None or actual.id != user_id):
+                    continue
+                rows.append([
+                    day, shop_idx, user_of(record.user), index_of(record.role, roles),
+                    index_of(record.status, statuses), user_of(actual), record.id,
+                ])
+
+    return {
+        'dates': [d.isoformat() for d in dates],
+        'shops': [[s.id, s.name] for s in shops],
+        'users': users,
+        'roles': roles,
+        'statuses': statuses,
+        'columns': ['day', 'shop', 'user', 'role', 'status', 'actual_user', 'shift_id'],
+        'rows': rows,
+    }
+
+
+class StaffTotalsRow:
+    __slots__ = ('user', 'weeks', 'duty', 'standby')
+
+    def __init__(self, user, weeks):
+        self.user = user
+        self.weeks = weeks # (duty, standby) per schedule
+        self.duty = sum(w[0] for w in weeks)
+        self.standby = sum(w[1] for w in weeks)
+
+
+def shift_counts(schedules, shops):
+    """
+    {(schedule_id, user_id): (duty, standby)} over the shops, in one grouped query.
+    """
+    rows = Shift.objects.filter(
+        schedule__in=[s.id for s in schedules if s.pk], shop_id__in=[s.id for s in shops]
+    ).values('schedule', 'user').annotate(
+        duty=Count('id', filter=Q(role='main')), standby=Count('id', filter=Q(role='backup'))
+    ).order_by()
+    return {(r['schedule'], r['user']): (r['duty'], r['standby']) for r in rows}
+
+
+def staff_totals(schedules, counts):
+    """
+    One row per scheduled user with their duty and standby counts per schedule and in total,
+    most duty first.
+    """
+    user_ids = {user_id for _, user_id in counts}
+    users = User.objects.filter(id__in=user_ids).only('id', 'username', 'first_name', 'last_name', 'nickname')
+    rows = [StaffTotalsRow(u, [counts.get((s.id, u.id), (0, 0)) for s in schedules]) for u in users]
+    rows.sort(key=lambda r: (-r.duty, r.user.get_short_name_for_schedule))
+    return rows
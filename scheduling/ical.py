@@ -0,0 +1,132 @@
+"""
+Per-user iCalendar feeds of published shifts.
+
+A feed is reached through its CalendarFeed token, without a login. The rendered feed and the
+token's owner live in Django's cache, keyed by a feed version (scheduling.versions) that the
+Shift, Schedule, Shop, ShopOperatingHours, CalendarFeed and User signals bump (see
+scheduling.signals). The version itself is cached for VERSION_MAX_AGE, so calendar apps
+polling an unchanged feed are answered without touching the database, and a rotated token or
+a deactivated user stops working in other processes within that time.
+"""
+import datetime
+import hashlib
+import secrets
+from django.core.cache import cache
+from django.utils import timezone
+from attendance.models import ShopOperatingHours
+from .models import CalendarFeed, Shift
+from .versions import get_version, bump_version, bump_version_on_commit
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_PAST_DAYS = 28 # Shifts older than this drop out of the feed
+VERSION_KEY = 'calendar_feed'
+VERSION_MAX_AGE = 60
+
+
+def get_feed_version():
+    return get_version(VERSION_KEY, max_age=VERSION_MAX_AGE)
+
+
+def bump_feed_version():
+    bump_version(VERSION_KEY)
+
+
+def bump_feed_version_on_commit():
+    bump_version_on_commit(VERSION_KEY)
+
+
+def rotate_feed_token(user):
+    """
+    Gives the user a new feed token (creating the feed on first use) and revokes the old one.
+    """
+    feed = CalendarFeed.objects.filter(user=user).first()
+    if feed:
+        feed.token = secrets.token_urlsafe(32)
+        feed.save()
+    else:
+        feed = CalendarFeed.objects.create(user=user, token=secrets.token_urlsafe(32))
+    return feed
+
+
+def feed_user_id(token):
+    """
+    The id of the active user the token belongs to, or None.
+    """
+    key = f'calendar_feed:token:{hashlib.md5(token.encode()).hexdigest()}:{get_feed_version()}'
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = CalendarFeed.objects.filter(token=token, user__is_active=True).values_list('user_id', flat=True).first()
+        cache.set(key, user_id or 0, FEED_CACHE_TIMEOUT) # 0: unknown tokens are cached too
+    return user_id or None
+
+
+def feed_etag(user_id):
+    return hashlib.md5(f'{user_id}:{get_feed_version()}'.encode()).hexdigest()
+
+
+def get_feed(user_id):
+    key = f'calendar_feed:body:{user_id}:{get_feed_version()}'
+    body = cache.get(key)
+    if body is None:
+        body = build_feed(user_id)
+        cache.set(key, body, FEED_CACHE_TIMEOUT)
+    return body
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _utc(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def build_feed(user_id):
+    """
+    The VCALENDAR text of the user's shifts in published schedules, from FEED_PAST_DAYS ago
+    on. Shifts of shops with operating hours that day are timed events, others all-day.
+    """
+    since = timezone.localdate() - datetime.timedelta(days=FEED_PAST_DAYS)
+    shifts = list(Shift.objects.filter(user_id=user_id, schedule__is_published=True, date__gte=since)
+                  .select_related('shop').only('id', 'date', 'role', 'shop__name').order_by('date', 'id'))
+    hours = {
+        (h.shop_id, h.day): h
+        for h in ShopOperatingHours.objects.filter(shop_id__in={s.shop_id for s in shifts})
+    }
+
+    stamp = _utc(timezone.now())
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//iMDiz HRIS//Schedule//EN',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:iMDiz Shifts',
+    ]
+    for shift in shifts:
+        role = shift.get_role_display()
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:shift-{shift.id}@imdiz-hris',
+            f'DTSTAMP:{stamp}',
+            f'SUMMARY:{_escape(f"{role} @ {shift.shop.name}")}',
+        ]
+        h = hours.get((shift.shop_id, shift.date.weekday()))
+        if h:
+            start = timezone.make_aware(datetime.datetime.combine(shift.date, h.open_time))
+            end = timezone.make_aware(datetime.datetime.combine(shift.date, h.close_time))
+            if end <= start:
+                end += datetime.timedelta(days=1) # Closes after midnight
+            lines += [
+                f'DTSTART:{_utc(start)}',
+                f'DTEND:{_utc(end)}',
+                f'DESCRIPTION:{_escape(f"{role} shift, {h.open_time:%H:%M}-{h.close_time:%H:%M}")}',
+            ]
+        else:
+            lines += [
+                f'DTSTART;VALUE=DATE:{shift.date:%Y%m%d}',
+                f'DTEND;VALUE=DATE:{shift.date + datetime.timedelta(days=1):%Y%m%d}',
+                f'DESCRIPTION:{_escape(f"{role} shift")}',
+            ]
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
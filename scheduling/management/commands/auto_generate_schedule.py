@@ -1,12 +1,81 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
 from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
 import datetime
+import os
+import time
+from accounts.models import Area
 from scheduling.models import Schedule
 from attendance.models import Shop
-from scheduling.views import _generate_schedule
+from scheduling.utils import ensure_roving_shop_and_assignments
+from scheduling.views import _generate_multi_week_schedule
+
+
+def _init_worker():
+    # Runs in each worker process. Connections inherited from the parent must not be reused.
+    import django
+    django.setup()
+    connections.close_all()
+
+
+@contextlib.contextmanager
+def write_transaction():
+    """
+    transaction.atomic() that takes SQLite's write lock at BEGIN (BEGIN IMMEDIATE) instead of
+    at the first write, so a concurrent writer makes it wait on the busy timeout rather than
+    fail with "database is locked" halfway through. Plain atomic() elsewhere and when nested.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection.ensure_connection() # Connecting resets transaction_mode from the settings
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic():
+            yield
+    finally:
+        connection.transaction_mode = previous
+
+
+def generate_area(area_id, schedule_id):
+    """
+    Generates one Area's shifts for the schedule in its own transaction.
+    Returns a result dict instead of raising, so one failing Area does not stop the others.
+    """
+    started = time.perf_counter()
+    result = {'area_id': area_id, 'area': str(area_id), 'status': 'failed', 'shifts': 0, 'seconds': 0.0, 'error': ''}
+    try:
+        area = Area.objects.get(id=area_id)
+        result['area'] = area.name
+        schedule = Schedule.objects.get(id=schedule_id)
+
+        # Roving first, same column order as the generator page
+        shops_qs = Shop.objects.filter(is_active=True, area=area)
+        shops = list(shops_qs.filter(name='Roving')) + list(shops_qs.exclude(name='Roving'))
+
+        with write_transaction():
+            _generate_multi_week_schedule(shops, [schedule], area, mode='auto')
+        result['shifts'] = schedule.shifts.filter(shop__area=area).count()
+        result['status'] = 'generated'
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - started
+    return result
+
 
 class Command(BaseCommand):
-    help = 'Automatically generates and publishes schedule if not done by Sunday 12AM'
+    help = 'Automatically generates and publishes schedule if not done by Sunday 12AM, one Area at a time (optionally in parallel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--areas', nargs='+', metavar='AREA', help='Only process these Areas (names or ids).')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be generated without writing anything.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (not on SQLite, which runs Areas one after another). '
+                                 'Defaults to one per Area up to the CPU count.')
 
     def handle(self, *args, **options):
         # This command is intended to be run by a cron job, likely at Sunday 00:01
@@ -24,29 +93,105 @@ class Command(BaseCommand):
         # Target = Today + 1
 
         target_start = today + datetime.timedelta(days=1)
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+
+        areas = self._select_areas(options['areas'])
+        if not areas:
+            self.stdout.write(self.style.WARNING("No Areas to process."))
+            return
+
+        if dry_run:
+            schedule = Schedule.objects.filter(week_start_date=target_start).first()
+        else:
+            ensure_roving_shop_and_assignments()
+            schedule, created = Schedule.objects.get_or_create(week_start_date=target_start)
 
-        # Check if schedule exists
-        schedule, created = Schedule.objects.get_or_create(week_start_date=target_start)
+        # Areas that already have shifts (someone generated them) are only published
+        pending = []
+        for area in areas:
+            if schedule and schedule.shifts.filter(shop__area=area).exists():
+                self.stdout.write(f"{area.name}: already generated, skipping.")
+            else:
+                pending.append(area)
 
-        if schedule.shifts.exists():
-            # Schedule has content, meaning someone generated it.
-            if not schedule.is_published:
-                self.stdout.write("Draft schedule exists. Auto-publishing it...")
-                schedule.is_published = True
-                schedule.save()
+        if dry_run:
+            for area in pending:
+                self.stdout.write(f"{area.name}: would generate schedule for {target_start}.")
+            if schedule and schedule.is_published:
+                self.stdout.write("Schedule already published.")
             else:
-                self.stdout.write(self.style.SUCCESS("Schedule already published."))
+                self.stdout.write(f"Would publish schedule for {target_start}.")
+            self.stdout.write(self.style.SUCCESS(f"Dry run complete: {len(pending)} of {len(areas)} Area(s) would be generated."))
             return
 
-        # If no shifts, it means it's empty (just created or empty). Generate it.
-        self.stdout.write("Generating schedule...")
-        shops = Shop.objects.filter(is_active=True)
+        # Each Area's transaction holds SQLite's single write lock from start to end, so
+        # parallel workers would only queue behind each other there
+        workers = options['workers']
+        if connection.vendor == 'sqlite':
+            if workers and workers > 1:
+                self.stdout.write(self.style.WARNING("SQLite has a single writer: generating Areas one at a time."))
+            workers = 1
+        elif workers is None:
+            workers = min(len(pending), os.cpu_count() or 1)
+        workers = max(1, min(workers, len(pending) or 1))
+
+        self.stdout.write(f"Generating schedule for {target_start}: {len(pending)} Area(s), {workers} worker(s)...")
+        results = self._run(pending, schedule, workers)
+
+        failed = [r for r in results if r['status'] != 'generated']
+        for r in sorted(results, key=lambda r: r['area']):
+            line = f"{r['area']}: {r['status']} ({r['shifts']} shifts) in {r['seconds']:.2f}s"
+            if r['error']:
+                self.stdout.write(self.style.ERROR(f"{line} - {r['error']}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
 
-        # Call the logic from views. Note: _generate_schedule signature changed to (shops, schedule)
-        _generate_schedule(shops, schedule)
+        # Publish whatever was generated; failed Areas can be regenerated from the generator page
+        if not schedule.is_published and schedule.shifts.exists():
+            schedule.is_published = True
+            schedule.save()
+            self.stdout.write("Schedule published.")
+        elif schedule.is_published:
+            self.stdout.write("Schedule already published.")
 
-        # Publish
-        schedule.is_published = True
-        schedule.save()
+        elapsed = time.perf_counter() - started
+        area_seconds = sum(r['seconds'] for r in results)
+        self.stdout.write(f"Total: {elapsed:.2f}s wall time, {area_seconds:.2f}s across Areas, {len(results) - len(failed)} generated, {len(failed)} failed.")
 
+        if failed:
+            raise CommandError(f"Generation failed for {len(failed)} Area(s): {', '.join(r['area'] for r in failed)}")
         self.stdout.write(self.style.SUCCESS(f"Successfully auto-generated and published schedule for {target_start}"))
+
+    def _select_areas(self, selectors):
+        areas = Area.objects.order_by('name')
+        if not selectors:
+            return list(areas)
+
+        ids = [int(s) for s in selectors if s.isdigit()]
+        names = [s for s in selectors if not s.isdigit()]
+        selected = list(areas.filter(id__in=ids) | areas.filter(name__in=names))
+
+        found = {str(a.id) for a in selected} | {a.name for a in selected}
+        missing = [s for s in selectors if s not in found]
+        if missing:
+            raise CommandError(f"Unknown Area(s): {', '.join(missing)}")
+        return selected
+
+    def _run(self, areas, schedule, workers):
+        if workers == 1:
+            return [generate_area(area.id, schedule.id) for area in areas]
+
+        # Workers open their own connections
+        connections.close_all()
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(generate_area, area.id, schedule.id): area for area in areas}
+            for future in as_completed(futures):
+                area = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Worker process died (the function itself does not raise)
+                    results.append({'area_id': area.id, 'area': area.name, 'status': 'failed', 'shifts': 0, 'seconds': 0.0, 'error': f"{type(e).__name__}: {e}"})
+        return results
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+import datetime
+import time
+from scheduling.models import ScoreBackfill
+from scheduling.utils import ScoreInputs, update_scores_for_date, compact_scores
+
+
+class Command(BaseCommand):
+    help = 'Replays the daily score update over a date range, resuming from the last checkpoint of an interrupted run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='from_date', required=True, help='First date to process (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='to_date', required=True, help='Last date to process (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=7, help='Days committed per transaction (default 7).')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an unfinished run over the same range.')
+
+    def handle(self, *args, **options):
+        from_date = self._parse_date(options['from_date'])
+        to_date = self._parse_date(options['to_date'])
+        if from_date > to_date:
+            raise CommandError("--from must not be after --to.")
+        batch_size = max(1, options['batch_size'])
+
+        backfill = None
+        if not options['restart']:
+            backfill = ScoreBackfill.objects.filter(from_date=from_date, to_date=to_date, completed_at__isnull=True).first()
+        if backfill and backfill.last_processed_date:
+            start_date = backfill.last_processed_date + datetime.timedelta(days=1)
+            self.stdout.write(f"Resuming from {start_date} ({backfill.days_processed} day(s) already processed).")
+        else:
+            backfill = backfill or ScoreBackfill.objects.create(from_date=from_date, to_date=to_date)
+            start_date = from_date
+
+        if start_date > to_date:
+            self._complete(backfill)
+            self.stdout.write(self.style.SUCCESS("Nothing left to process."))
+            return
+
+        # One preloaded view of the remaining range instead of two queries per day
+        inputs = ScoreInputs(start_date, to_date)
+        days = [start_date + datetime.timedelta(days=i) for i in range((to_date - start_date).days + 1)]
+
+        started = time.perf_counter()
+        days_done = 0
+        rows_done = 0
+        for batch_start in range(0, len(days), batch_size):
+            batch = days[batch_start:batch_start + batch_size]
+            batch_rows = 0
+
+            # Scores and checkpoint are committed together, so a crash resumes at the first uncommitted day
+            with transaction.atomic():
+                for target_date in batch:
+                    batch_rows += update_scores_for_date(target_date, inputs=inputs)
+                compact_scores(as_of_date=batch[-1], keep_snapshot=True)
+                backfill.last_processed_date = batch[-1]
+                backfill.days_processed += len(batch)
+                backfill.rows_touched += batch_rows
+                backfill.save()
+
+            days_done += len(batch)
+            rows_done += batch_rows
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Committed through {batch[-1]}: {days_done}/{len(days)} days, {rows_done} rows, {days_done / elapsed:.1f} days/s")
+
+        self._complete(backfill)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill complete: {days_done} day(s), {rows_done} row(s) touched in {elapsed:.2f}s "
+            f"({days_done / elapsed:.1f} days/s, {rows_done / elapsed:.0f} rows/s)."
+        ))
+
+    def _parse_date(self, value):
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+    def _complete(self, backfill):
+        backfill.completed_at = timezone.now()
+        backfill.save()
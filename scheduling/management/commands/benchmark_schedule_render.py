@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.utils import timezone
+import time
+from accounts.models import User
+from scheduling.models import Schedule
+from scheduling import views
+
+
+class Command(BaseCommand):
+    help = 'Times the schedule pages (my_schedule, schedule_history_detail, generator) for a user, after one warm-up request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to view as (default: the first administrator).')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per page (default 20).')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(tier='administrator').first() or User.objects.filter(is_superuser=True).first()
+        if not user:
+            raise CommandError("No user to view the pages as.")
+
+        factory = RequestFactory()
+        pages = [('my_schedule', '/scheduling/my-schedule/', views.my_schedule, {})]
+
+        schedule = Schedule.objects.filter(is_published=True, week_start_date__lte=timezone.localdate()).order_by('-week_start_date').first()
+        if schedule:
+            pages.append(('schedule_history_detail', f'/scheduling/history/{schedule.id}/', views.schedule_history_detail, {'schedule_id': schedule.id}))
+
+        generator_path = '/scheduling/generator/'
+        if user.area_id and user.tier != 'supervisor':
+            generator_path += f'?area_id={user.area_id}'
+        pages.append(('generator', generator_path, views.generator, {}))
+
+        for name, path, view, kwargs in pages:
+            request = factory.get(path)
+            request.user = user
+            view(request, **kwargs) # Warm-up (fills the grid cache)
+
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                request = factory.get(path)
+                request.user = user
+                response = view(request, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / options['repeat']
+            self.stdout.write(f"{name}: {elapsed_ms:.1f} ms per request, {len(response.content) / 1024:.0f} KB")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from scheduling.utils import ensure_score_rows
+
+
+class Command(BaseCommand):
+    help = 'Starts the score of every (user, applicable shop) pair that has none, in bulk. Safe to re-run.'
+
+    def handle(self, *args, **options):
+        # Assignments made through the admin or the m2m signal already have scores;
+        # this catches pairs created without signals (raw SQL, fixtures, bulk imports).
+        created = ensure_score_rows()
+        self.stdout.write(self.style.SUCCESS(f"Started {created} score(s)."))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 import datetime
-from scheduling.utils import update_scores_for_date
+from scheduling.utils import update_scores_for_date, compact_scores
 
 class Command(BaseCommand):
     help = 'Updates user scores based on yesterday\'s attendance'
@@ -13,4 +13,7 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Running score update for {yesterday}")
         update_scores_for_date(yesterday)
+
+        # Fold the day's events into UserShopScore; keep a snapshot at the end of each week
+        compact_scores(as_of_date=yesterday, keep_snapshot=(yesterday.weekday() == 6))
         self.stdout.write(self.style.SUCCESS("Score update complete."))
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_area_user_area"),
+        ("scheduling", "0006_shift_score_breakdown"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoringRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=50)),
+                ("weight", models.FloatField()),
+                (
+                    "area",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scoring_rules",
+                        to="accounts.area",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["area", "code"],
+                "unique_together": {("area", "code")},
+            },
+        ),
+    ]
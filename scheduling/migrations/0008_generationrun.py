@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_area_user_area"),
+        ("scheduling", "0007_scoringrule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("manual", "Manual"),
+                            ("auto", "Auto"),
+                            ("load_test", "Load Test"),
+                        ],
+                        default="manual",
+                        max_length=20,
+                    ),
+                ),
+                ("week_count", models.PositiveIntegerField(default=1)),
+                ("user_count", models.PositiveIntegerField(default=0)),
+                ("shop_count", models.PositiveIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0.0)),
+                ("total_queries", models.PositiveIntegerField(default=0)),
+                ("phases", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "area",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="generation_runs",
+                        to="accounts.area",
+                    ),
+                ),
+                (
+                    "schedule",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="generation_runs",
+                        to="scheduling.schedule",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scheduling", "0009_scorebackfill"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreRunLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                ("input_digest", models.CharField(max_length=64)),
+                ("score_changes", models.JSONField(default=dict)),
+                ("processed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-date"],
+            },
+        ),
+    ]
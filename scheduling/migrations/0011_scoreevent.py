@@ -0,0 +1,158 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_snapshot(apps, schema_editor):
+    # Existing scores become the first snapshot, so past scores can be rebuilt from it
+    UserShopScore = apps.get_model("scheduling", "UserShopScore")
+    ScoreCompaction = apps.get_model("scheduling", "ScoreCompaction")
+    ScoreSnapshot = apps.get_model("scheduling", "ScoreSnapshot")
+
+    rows = list(UserShopScore.objects.values_list("user_id", "shop_id", "score"))
+    compaction = ScoreCompaction.objects.create(
+        last_event_id=0, row_count=len(rows), has_snapshot=True
+    )
+    ScoreSnapshot.objects.bulk_create(
+        [
+            ScoreSnapshot(
+                compaction=compaction, user_id=user_id, shop_id=shop_id, score=score
+            )
+            for user_id, shop_id, score in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0004_shop_area"),
+        ("scheduling", "0010_scorerunledger"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreCompaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_event_id", models.PositiveBigIntegerField(default=0)),
+                ("as_of_date", models.DateField(blank=True, null=True)),
+                ("row_count", models.PositiveIntegerField(default=0)),
+                ("has_snapshot", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-last_event_id"],
+            },
+        ),
+        migrations.RemoveField(
+            model_name="scorerunledger",
+            name="score_changes",
+        ),
+        migrations.CreateModel(
+            name="ScoreEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(db_index=True)),
+                ("delta", models.FloatField()),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("initial", "Initial Score"),
+                            ("missed_duty", "Missed Duty"),
+                            ("standby_worked", "Standby Worked"),
+                            ("standby_idle", "Standby Idle"),
+                            ("duty_worked", "Duty Worked"),
+                            ("duty_worked_shop", "Duty Worked (Shop)"),
+                            ("normalization", "Normalization"),
+                            ("reversal", "Reversal"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_events",
+                        to="attendance.shop",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ScoreSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "compaction",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="scheduling.scorecompaction",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="attendance.shop",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("compaction", "user", "shop")},
+            },
+        ),
+        migrations.RunPython(seed_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 13:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0004_shop_area"),
+        ("scheduling", "0012_shop_wide_score_events"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="scoreevent",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("reason", "initial")),
+                fields=("user", "shop"),
+                name="unique_initial_score_event",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scheduling", "0015_cacheversion"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="schedule",
+            name="week_start_date",
+            field=models.DateField(db_index=True),
+        ),
+    ]
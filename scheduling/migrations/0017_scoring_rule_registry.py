@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+import scheduling.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_user_search_lower_indexes"),
+        ("scheduling", "0016_schedule_week_start_date_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="scoringrule",
+            name="code",
+            field=models.CharField(
+                choices=scheduling.models.scoring_rule_choices, max_length=50
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="scoringrule",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("area__isnull", True)),
+                fields=("code",),
+                name="unique_default_scoring_rule",
+            ),
+        ),
+    ]
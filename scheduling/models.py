@@ -21,7 +21,7 @@ class Preference(models.Model):
         return f"{self.user} Preferences"
 
 class Schedule(models.Model):
-    week_start_date = models.DateField() # Should typically be a Sunday or Monday
+    week_start_date = models.DateField(db_index=True) # Should typically be a Sunday or Monday. Indexed for history paging
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -72,6 +72,9 @@ class UserPriority(models.Model):
         return f"{self.user}: {self.score}"
 
 class UserShopScore(models.Model):
+    """
+    Score snapshot as of the last ScoreCompaction. Adjustments since then are ScoreEvent rows.
+    """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='shop_scores')
     shop = models.ForeignKey('attendance.Shop', on_delete=models.CASCADE, related_name='staff_scores')
     score = models.FloatField(default=100.0)
@@ -94,3 +97,176 @@ class ShopRequirement(models.Model):
 
     def __str__(self):
         return f"{self.shop}: Duty {self.required_main_staff}, Standby {self.required_reserve_staff}"
+
+def scoring_rule_choices():
+    from .scoring import RULE_REGISTRY # scoring imports this module
+    return [(code, spec.label) for code, spec in RULE_REGISTRY.items()]
+
+class ScoringRule(models.Model):
+    """
+    Stores the weight of one duty scoring rule (see scheduling.scoring) for an Area.
+    Rows with no Area act as the company-wide default; rules without any row use the code default.
+    """
+    area = models.ForeignKey('accounts.Area', on_delete=models.CASCADE, null=True, blank=True, related_name='scoring_rules')
+    code = models.CharField(max_length=50, choices=scoring_rule_choices) # Only registered rules
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('area', 'code')
+        constraints = [
+            # unique_together treats NULL Areas as distinct: one company-wide row per rule
+            models.UniqueConstraint(fields=['code'], condition=models.Q(area__isnull=True), name='unique_default_scoring_rule'),
+        ]
+        ordering = ['area', 'code']
+
+    def __str__(self):
+        return f"{self.area or 'All Areas'} - {self.code}: {self.weight}"
+
+class GenerationRun(models.Model):
+    """
+    Timing and query counts of one schedule generation run, per phase.
+    """
+    MODE_CHOICES = (
+        ('manual', 'Manual'),
+        ('auto', 'Auto'),
+        ('load_test', 'Load Test'),
+    )
+
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='generation_runs') # First week of the run
+    area = models.ForeignKey('accounts.Area', on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_runs')
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default='manual')
+    week_count = models.PositiveIntegerField(default=1)
+    user_count = models.PositiveIntegerField(default=0)
+    shop_count = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0.0)
+    total_queries = models.PositiveIntegerField(default=0)
+    phases = models.JSONField(default=dict) # phase -> {'ms': float, 'queries': int}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Generation for {self.area} ({self.mode}) on {self.created_at}: {self.total_ms:.0f} ms"
+
+class ScoreBackfill(models.Model):
+    """
+    Checkpoint of a backfill_scores run over a date range, so an interrupted run can resume
+    after the last committed day.
+    """
+    from_date = models.DateField()
+    to_date = models.DateField()
+    last_processed_date = models.DateField(null=True, blank=True)
+    days_processed = models.PositiveIntegerField(default=0)
+    rows_touched = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Score backfill {self.from_date} to {self.to_date} (last: {self.last_processed_date})"
+
+class ScoreRunLedger(models.Model):
+    """
+    One row per date processed by update_scores_for_date: a digest of the day's inputs
+    (shifts and attendance), so the day can be skipped when unchanged or reversed
+    (through its ScoreEvent rows) and reapplied when its inputs change.
+    """
+    date = models.DateField(unique=True)
+    input_digest = models.CharField(max_length=64)
+    processed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Scores processed for {self.date}"
+
+class ScoreEvent(models.Model):
+    """
+    Append-only log of score adjustments. The current score of a user at a shop is the
+    UserShopScore snapshot plus the events after the last ScoreCompaction, in id order.
+    Events without a user (normalization) apply to every score the shop had at that point.
+    """
+    REASON_CHOICES = (
+        ('initial', 'Initial Score'),
+        ('missed_duty', 'Missed Duty'),
+        ('standby_worked', 'Standby Worked'),
+        ('standby_idle', 'Standby Idle'),
+        ('duty_worked', 'Duty Worked'),
+        ('duty_worked_shop', 'Duty Worked (Shop)'),
+        ('normalization', 'Normalization'),
+        ('reversal', 'Reversal'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='score_events') # None: whole shop
+    shop = models.ForeignKey('attendance.Shop', on_delete=models.CASCADE, related_name='score_events')
+    date = models.DateField(db_index=True) # Day whose attendance caused the adjustment
+    delta = models.FloatField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # A score starts once; lets ensure_score_rows insert with ignore_conflicts
+            models.UniqueConstraint(fields=['user', 'shop'], condition=models.Q(reason='initial'), name='unique_initial_score_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.user or 'All Staff'} - {self.shop}: {self.delta:+} ({self.reason})"
+
+class ScoreCompaction(models.Model):
+    """
+    Marks the ScoreEvent rows folded into UserShopScore. Compactions with has_snapshot keep
+    a copy of the scores (ScoreSnapshot) so past scores can be rebuilt from the nearest one.
+    """
+    last_event_id = models.PositiveBigIntegerField(default=0) # Events up to this id are in the snapshot
+    as_of_date = models.DateField(null=True, blank=True) # Last processed day included (None: before any event)
+    row_count = models.PositiveIntegerField(default=0)
+    has_snapshot = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-last_event_id']
+
+    def __str__(self):
+        return f"Score compaction through event {self.last_event_id} ({self.as_of_date})"
+
+class ScoreSnapshot(models.Model):
+    compaction = models.ForeignKey(ScoreCompaction, on_delete=models.CASCADE, related_name='snapshots')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    shop = models.ForeignKey('attendance.Shop', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('compaction', 'user', 'shop')
+
+    def __str__(self):
+        return f"{self.user} - {self.shop}: {self.score} (compaction {self.compaction_id})"
+
+class CalendarFeed(models.Model):
+    """
+    Secret token of a user's iCalendar feed of their published shifts. Rotating the token
+    revokes the old feed URL.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendar feed of {self.user}"
+
+class CacheVersion(models.Model):
+    """
+    Version counter of a cached read model (a week's schedule grids, the calendar feeds).
+    Cache keys include the version, and the counter lives here rather than in the cache so a
+    bump from any process (management commands, the ASGI punch endpoint) reaches every worker.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
@@ -0,0 +1,57 @@
+"""
+Per-phase timing and query counting for the schedule generation engine.
+"""
+import time
+from django.db import connection
+from scheduling.models import GenerationRun
+
+
+class GenerationProfiler:
+    PHASES = ('context_load', 'history_load', 'duty_slots', 'standby', 'persistence')
+
+    def __init__(self):
+        self.phases = {name: {'ms': 0.0, 'queries': 0} for name in self.PHASES}
+        self.current_phase = None
+        self.phase_started = None
+        self.user_count = 0
+        self.shop_count = 0
+
+    def __enter__(self):
+        connection.execute_wrappers.append(self._count_query)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.phase(None)
+        connection.execute_wrappers.remove(self._count_query)
+        return False
+
+    def _count_query(self, execute, sql, params, many, context):
+        if self.current_phase:
+            self.phases[self.current_phase]['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def phase(self, name):
+        """
+        Ends the running phase (if any) and starts 'name'. Phases can be re-entered;
+        time and queries accumulate (e.g. once per generated week).
+        """
+        now = time.perf_counter()
+        if self.current_phase:
+            self.phases[self.current_phase]['ms'] += (now - self.phase_started) * 1000.0
+        self.current_phase = name
+        self.phase_started = now
+
+    def save(self, schedule, area, mode='manual', week_count=1):
+        for stats in self.phases.values():
+            stats['ms'] = round(stats['ms'], 2)
+        return GenerationRun.objects.create(
+            schedule=schedule,
+            area=area,
+            mode=mode,
+            week_count=week_count,
+            user_count=self.user_count,
+            shop_count=self.shop_count,
+            total_ms=round(sum(p['ms'] for p in self.phases.values()), 2),
+            total_queries=sum(p['queries'] for p in self.phases.values()),
+            phases=self.phases,
+        )
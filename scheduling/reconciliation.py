@@ -0,0 +1,92 @@
+"""
+Attendance reconciliation for schedule grids.
+
+Matches a week's shifts to its TimeLogs with dict lookups keyed by (date, shop_id, user_id)
+and hands unmatched logs to absent duty shifts of the same shop and day (substitutes) before
+listing the rest as supplements. Runs in time linear in shifts + logs (+ the grid cells).
+Used by my_schedule and schedule_history_detail through scheduling.grid.
+"""
+import collections
+
+
+class ShiftStatus:
+    """
+    One entry of a grid cell. role is 'main', 'backup' or 'supplement' (reported without a
+    shift there, id is None). status is one of reported, ongoing, incomplete, absent,
+    substituted, supplement, or '' (not yet due).
+    """
+    __slots__ = ('id', 'user', 'role', 'status', 'actual_user')
+
+    def __init__(self, id, user, role, status='', actual_user=None):
+        self.id = id
+        self.user = user
+        self.role = role
+        self.status = status
+        self.actual_user = actual_user
+
+
+def _log_status(log, date, today):
+    if log.time_in and not log.time_out:
+        if date == today:
+            return 'ongoing'
+        if date < today:
+            return 'incomplete'
+    return 'reported'
+
+
+def reconcile_week(dates, shops, shifts, logs, today):
+    """
+    shifts: Shift rows (user loaded) in display order. logs: TimeLog rows (user loaded) of the dates.
+    Returns {date: {shop_id: {'main': [ShiftStatus], 'backup': [ShiftStatus]}}} for the shops.
+    """
+    matrix = {d: {s.id: {'main': [], 'backup': []} for s in shops} for d in dates}
+
+    logs_by_key = {} # (date, shop_id, user_id) -> TimeLog
+    logs_by_cell = {} # (date, shop_id) -> [TimeLog]
+    for log in logs:
+        if log.shop_id is None:
+            continue
+        logs_by_key[(log.date, log.shop_id, log.user_id)] = log
+        logs_by_cell.setdefault((log.date, log.shop_id), []).append(log)
+
+    matched = set() # keys of logs that belong to a duty shift
+    for shift in shifts:
+        cell = matrix.get(shift.date, {}).get(shift.shop_id)
+        if cell is None:
+            continue
+        key = (shift.date, shift.shop_id, shift.user_id)
+        log = logs_by_key.get(key)
+
+        if shift.role == 'main':
+            record = ShiftStatus(shift.id, shift.user, 'main')
+            if log:
+                record.status = _log_status(log, shift.date, today)
+                record.actual_user = shift.user
+                matched.add(key)
+            elif shift.date < today:
+                # Absent only once the day has passed
+                record.status = 'absent'
+            cell['main'].append(record)
+        else:
+            cell['backup'].append(ShiftStatus(shift.id, shift.user, shift.role, 'reported' if log else ''))
+
+    # Remaining logs of a shop and day substitute its absent duty staff, in log order
+    for (d, shop_id), cell_logs in logs_by_cell.items():
+        cell = matrix.get(d, {}).get(shop_id)
+        if cell is None:
+            continue
+        unmatched = collections.deque(log.user for log in cell_logs if (d, shop_id, log.user_id) not in matched)
+        if not unmatched:
+            continue
+
+        for record in cell['main']:
+            if not unmatched:
+                break
+            if record.status == 'absent':
+                record.actual_user = unmatched.popleft()
+                record.status = 'substituted'
+
+        for user in unmatched:
+            cell['main'].append(ShiftStatus(None, user, 'supplement', 'supplement', user))
+
+    return matrix
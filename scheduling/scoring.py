@@ -0,0 +1,219 @@
+"""
+Duty assignment scoring rules.
+
+Each rule is registered once with its breakdown label and default weight. Weights can be
+overridden per Area through ScoringRule rows. At generation start the rules are compiled
+into a flat list of closures (CompiledScorer), so the candidate loop only calls functions
+and does dictionary lookups.
+"""
+import datetime
+from django.db.models import Q
+from scheduling.models import Preference, ScoringRule
+
+RULE_REGISTRY = {} # code -> RuleSpec, in breakdown order
+
+
+class RuleSpec:
+    def __init__(self, code, label, default_weight, factory, uses_history=False):
+        self.code = code
+        self.label = label
+        self.default_weight = default_weight
+        self.factory = factory
+        self.uses_history = uses_history
+
+
+def register_rule(code, label, default_weight, uses_history=False):
+    """
+    Registers a rule factory. The factory receives the weight and returns a closure
+    fn(user, shop, date, history, assignments, min_duty) -> points (0 means not applied).
+    """
+    def decorator(factory):
+        RULE_REGISTRY[code] = RuleSpec(code, label, default_weight, factory, uses_history)
+        return factory
+    return decorator
+
+
+class HistoryIndex:
+    """
+    Per-user tallies of the history_data used by the scoring rules, built once per week
+    instead of scanning the log and shift lists for every candidate.
+
+    history_data:
+      - prev_week_logs: List of TimeLog for the previous week
+      - past_3_weeks_logs: List of TimeLog for the 3 weeks prior to previous week
+      - prev_week_shifts: List of Shift for the previous week
+    """
+    def __init__(self, history_data):
+        self.prev_shop_days = {} # (user_id, shop_id) -> days reported
+        self.prev_days = {} # user_id -> days reported (any shop)
+        self.past_shop_weeks = {} # (user_id, shop_id) -> weeks reported at least once
+        self.substitutions = {} # user_id -> standby days actually worked
+        self.absences = {} # user_id -> duty days not worked
+        self.prev_duty_counts = {} # user_id -> duty shifts in previous week
+
+        worked_dates = set()
+        for log in history_data['prev_week_logs']:
+            self.prev_days[log.user_id] = self.prev_days.get(log.user_id, 0) + 1
+            worked_dates.add((log.user_id, log.date))
+            if log.shop_id:
+                key = (log.user_id, log.shop_id)
+                self.prev_shop_days[key] = self.prev_shop_days.get(key, 0) + 1
+
+        weeks_worked = set()
+        for log in history_data['past_3_weeks_logs']:
+            if log.shop_id:
+                weeks_worked.add((log.user_id, log.shop_id, log.date.isocalendar()[:2]))
+        for user_id, shop_id, week in weeks_worked:
+            key = (user_id, shop_id)
+            self.past_shop_weeks[key] = self.past_shop_weeks.get(key, 0) + 1
+
+        for shift in history_data['prev_week_shifts']:
+            worked = (shift.user_id, shift.date) in worked_dates
+            if shift.role == 'backup':
+                if worked:
+                    self.substitutions[shift.user_id] = self.substitutions.get(shift.user_id, 0) + 1
+            elif shift.role == 'main':
+                self.prev_duty_counts[shift.user_id] = self.prev_duty_counts.get(shift.user_id, 0) + 1
+                if not worked:
+                    self.absences[shift.user_id] = self.absences.get(shift.user_id, 0) + 1
+
+
+@register_rule('base', 'Base Score', 20.0)
+def _base_rule(weight):
+    # Applied unconditionally by CompiledScorer; kept here so the label and weight are configurable.
+    return None
+
+@register_rule('prev_week_same_shop', 'Prev Week Same Shop Attendance', -1.0, uses_history=True)
+def _prev_week_same_shop_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return history.prev_shop_days.get((user.id, shop.id), 0) * weight
+    return rule
+
+@register_rule('past_3_weeks_same_shop', 'Past 3 Weeks Same Shop Attendance', -1.0, uses_history=True)
+def _past_3_weeks_same_shop_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return history.past_shop_weeks.get((user.id, shop.id), 0) * weight
+    return rule
+
+@register_rule('prev_week_attendance', 'Prev Week Attendance (Any Shop)', -1.0, uses_history=True)
+def _prev_week_attendance_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return history.prev_days.get(user.id, 0) * weight
+    return rule
+
+@register_rule('current_week_duty', 'Current Week Duty Assignments', -2.0)
+def _current_week_duty_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return assignments.get_duty_count(user.id) * weight
+    return rule
+
+@register_rule('preferred_day_off', 'Preferred Day Off', -5.0)
+def _preferred_day_off_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        try:
+            if user.preference.top_preferred_day_off == date.weekday():
+                return weight
+        except Preference.DoesNotExist:
+            pass
+        return 0
+    return rule
+
+@register_rule('prev_week_substitutions', 'Prev Week Substitutions', -2.0, uses_history=True)
+def _prev_week_substitutions_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return history.substitutions.get(user.id, 0) * weight
+    return rule
+
+@register_rule('sixth_duty', '6+ Duty Assignments', -4.0)
+def _sixth_duty_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return weight if assignments.get_duty_count(user.id) >= 6 else 0
+    return rule
+
+@register_rule('prev_week_absences', 'Prev Week Absences', 4.0, uses_history=True)
+def _prev_week_absences_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        return history.absences.get(user.id, 0) * weight
+    return rule
+
+@register_rule('fewest_shifts', 'Fewest Shifts Bonus', 1.0)
+def _fewest_shifts_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        if min_duty is not None and assignments.get_duty_count(user.id) == min_duty:
+            return weight
+        return 0
+    return rule
+
+@register_rule('consecutive_same_shop', 'Consecutive Day Same Shop Bonus', 1.0)
+def _consecutive_same_shop_rule(weight):
+    one_day = datetime.timedelta(days=1)
+    def rule(user, shop, date, history, assignments, min_duty):
+        return weight if assignments.is_assigned_to_shop_on_day(user.id, shop.id, date - one_day) else 0
+    return rule
+
+@register_rule('two_days_off', '2+ Days Off Bonus', 10.0)
+def _two_days_off_rule(weight):
+    def rule(user, shop, date, history, assignments, min_duty):
+        # Days earlier in the same week (Monday up to the day before) without an assignment
+        days_off_count = 0
+        for i in range(1, date.weekday() + 1):
+            if not assignments.is_assigned_on_day(user.id, date - datetime.timedelta(days=i)):
+                days_off_count += 1
+        return weight if days_off_count >= 2 else 0
+    return rule
+
+
+class CompiledScorer:
+    def __init__(self, weights):
+        self.weights = weights
+        self.base_label = RULE_REGISTRY['base'].label
+        self.base_weight = weights['base']
+
+        # Two flat rule lists so the hot loop never checks use_attendance_history per rule
+        self.rules_with_history = []
+        self.rules_without_history = []
+        for code, spec in RULE_REGISTRY.items():
+            if code == 'base':
+                continue
+            entry = (spec.label, spec.factory(weights[code]))
+            self.rules_with_history.append(entry)
+            if not spec.uses_history:
+                self.rules_without_history.append(entry)
+
+    def score(self, user, shop, date, history, assignments, min_duty=None, use_attendance_history=True):
+        rules = self.rules_with_history if use_attendance_history else self.rules_without_history
+        score = self.base_weight
+        breakdown = {self.base_label: self.base_weight}
+        for label, rule in rules:
+            points = rule(user, shop, date, history, assignments, min_duty)
+            if points:
+                score += points
+                breakdown[label] = points
+        return score, breakdown
+
+
+def get_rule_weights(area=None):
+    """
+    Returns {code: weight} for every registered rule: Area rows first, then company-wide rows,
+    then the code defaults.
+    """
+    weights = {code: spec.default_weight for code, spec in RULE_REGISTRY.items()}
+    area_filter = Q(area__isnull=True)
+    if area:
+        area_filter |= Q(area=area)
+    overrides = ScoringRule.objects.filter(area_filter, code__in=weights.keys())
+
+    # Company-wide rows are applied first so Area rows win
+    for rule in sorted(overrides, key=lambda r: r.area_id is not None):
+        weights[rule.code] = rule.weight
+    return weights
+
+
+def compile_scoring_rules(area=None):
+    """
+    Loads the weights for the Area (one query) and compiles them. Call once per generation run.
+    """
+    return CompiledScorer(get_rule_weights(area))
+
+
+DEFAULT_SCORER = CompiledScorer({code: spec.default_weight for code, spec in RULE_REGISTRY.items()})
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import User
+from attendance.models import Shop, ShopOperatingHours, TimeLog
+from .models import CalendarFeed, Schedule, Shift, ScheduleChangeLog
+from .grid import bump_grid_version_on_commit, week_start_for
+from .ical import bump_feed_version_on_commit
+from .utils import ensure_score_rows
+
+@receiver(m2m_changed, sender=User.applicable_shops.through)
+def create_scores_for_applicable_shops(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Gives every new (user, applicable shop) pair its starting score in one bulk insert,
+    so the nightly score update never has to create them.
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    # reverse: shop.applicable_staff.add(...), pk_set holds user ids
+    user_ids = pk_set if reverse else [instance.pk]
+    ensure_score_rows(user_ids)
+
+@receiver([post_save, post_delete], sender=Shift)
+@receiver([post_save, post_delete], sender=TimeLog)
+def invalidate_grid_for_date(sender, instance, **kwargs):
+    # Cached schedule grids of the week are rebuilt on their next view (one bump per commit)
+    bump_grid_version_on_commit(week_start_for(instance.date))
+
+@receiver([post_save, post_delete], sender=ScheduleChangeLog)
+def invalidate_grid_for_change_log(sender, instance, **kwargs):
+    try:
+        bump_grid_version_on_commit(instance.schedule.week_start_date)
+    except Schedule.DoesNotExist:
+        pass # Deleted together with its schedule
+
+@receiver([post_save, post_delete], sender=Shift)
+@receiver([post_save, post_delete], sender=Schedule)
+@receiver([post_save, post_delete], sender=Shop)
+@receiver([post_save, post_delete], sender=ShopOperatingHours)
+@receiver([post_save, post_delete], sender=CalendarFeed)
+def invalidate_calendar_feeds(sender, instance, **kwargs):
+    # Shifts, publishing and shop names/hours all show in the feeds, and the cached token
+    # owners must forget rotated tokens (one bump per commit)
+    bump_feed_version_on_commit()
+
+@receiver(post_save, sender=User)
+def invalidate_calendar_feeds_for_user(sender, instance, created, update_fields=None, **kwargs):
+    # Deactivated users lose their feed; new users have none, and saves of other fields
+    # (e.g. last_login) leave it
+    if not created and (update_fields is None or 'is_active' in update_fields):
+        bump_feed_version_on_commit()
@@ -1,14 +1,24 @@
+from types import SimpleNamespace as NS
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
 from accounts.models import User, Area
-from attendance.models import Shop
-from scheduling.models import UserShopScore, Schedule, Shift, Preference
-from scheduling.views import _generate_multi_week_schedule
+from attendance.models import Shop, ShopOperatingHours
+from scheduling.models import UserShopScore, Schedule, Shift, Preference, CacheVersion
+from scheduling.views import _generate_multi_week_schedule, HISTORY_PAGE_SIZE
+from scheduling.grid import build_schedule_grid, grid_cache_stats, get_grid_version
+from scheduling.ical import rotate_feed_token, VERSION_KEY
+from scheduling.reconciliation import reconcile_week
 from scheduling.management.commands.update_attendance_scores import Command as UpdateScoreCommand
 from attendance.models import TimeLog
 from scheduling.utils import ensure_roving_shop_and_assignments
 import datetime
 
-class ScheduleAlgorithmTests(TestCase):
+class SchedulingFixtureMixin:
     def setUp(self):
         # Create Area
         self.area = Area.objects.create(name="Test Area")
@@ -33,6 +43,20 @@ class ScheduleAlgorithmTests(TestCase):
         ShopRequirement.objects.create(shop=self.shop1, required_main_staff=2, required_reserve_staff=0)
         ShopRequirement.objects.create(shop=self.shop2, required_main_staff=1, required_reserve_staff=1)
 
+    def generate_week(self, weeks_ago=0):
+        """
+        Empties the cache and generates a published schedule for the fixture shops, of the
+        current week or the given number of weeks before it.
+        """
+        cache.clear()
+        today = timezone.localdate()
+        week_start = today - datetime.timedelta(days=today.weekday(), weeks=weeks_ago)
+        with self.captureOnCommitCallbacks(execute=True): # TestCase never commits
+            self.schedule = Schedule.objects.create(week_start_date=week_start, is_published=True)
+            _generate_multi_week_schedule([self.roving_shop, self.shop1, self.shop2], [self.schedule], self.area)
+
+
+class ScheduleAlgorithmTests(SchedulingFixtureMixin, TestCase):
     def test_roving_assignment_logic(self):
         # Verify assignments were set correctly by ensure_roving_shop_and_assignments
         self.assertTrue(self.roving_shop in self.sup.applicable_shops.all())
@@ -79,3 +103,874 @@ class ScheduleAlgorithmTests(TestCase):
 
         if s2_main and s2_res:
             self.assertNotEqual(s2_main.user, s2_res.user)
+
+    def test_generation_run_recorded(self):
+        from scheduling.models import GenerationRun
+        start_date = datetime.date.today()
+        weeks = [Schedule.objects.create(week_start_date=start_date)]
+        run = _generate_multi_week_schedule([self.shop1, self.shop2], weeks, self.area)
+
+        self.assertEqual(GenerationRun.objects.filter(schedule=weeks[0], area=self.area).count(), 1)
+        self.assertEqual(run.mode, 'manual')
+        self.assertEqual(run.user_count, 4)
+        self.assertEqual(run.shop_count, 2)
+        self.assertEqual(list(run.phases.keys()), ['context_load', 'history_load', 'duty_slots', 'standby', 'persistence'])
+        self.assertGreater(run.phases['persistence']['queries'], 0)
+        self.assertEqual(run.total_queries, sum(p['queries'] for p in run.phases.values()))
+
+
+class AutoGenerateScheduleCommandTests(TestCase):
+    def setUp(self):
+        from scheduling.models import ShopRequirement
+        self.sunday = datetime.date(2025, 1, 5)
+        self.monday = self.sunday + datetime.timedelta(days=1)
+        self.area1 = Area.objects.create(name="Area 1")
+        self.area2 = Area.objects.create(name="Area 2")
+        for area in [self.area1, self.area2]:
+            shop = Shop.objects.create(name=f"{area.name} Shop", is_active=True, area=area)
+            ShopRequirement.objects.create(shop=shop, required_main_staff=1)
+            for i in range(2):
+                User.objects.create_user(username=f'u{i}_{area.id}', first_name=f'U{i}', last_name=area.name, is_active=True, is_approved=True, tier='regular', area=area)
+
+    def _call(self, *args):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        out = StringIO()
+        with mock.patch('django.utils.timezone.localdate', return_value=self.sunday):
+            call_command('auto_generate_schedule', *args, stdout=out)
+        return out.getvalue()
+
+    def test_generates_each_area_and_publishes(self):
+        output = self._call()
+        schedule = Schedule.objects.get(week_start_date=self.monday)
+        self.assertTrue(schedule.is_published)
+        for area in [self.area1, self.area2]:
+            self.assertTrue(Shift.objects.filter(schedule=schedule, shop__area=area, role='main').exists())
+            self.assertIn(f"{area.name}: generated", output)
+
+    def test_dry_run_writes_nothing(self):
+        output = self._call('--dry-run')
+        self.assertFalse(Schedule.objects.exists())
+        self.assertIn("Area 1: would generate", output)
+
+    def test_areas_filter(self):
+        self._call('--areas', 'Area 2')
+        schedule = Schedule.objects.get(week_start_date=self.monday)
+        self.assertFalse(Shift.objects.filter(schedule=schedule, shop__area=self.area1).exists())
+        self.assertTrue(Shift.objects.filter(schedule=schedule, shop__area=self.area2).exists())
+
+    def test_failing_area_does_not_abort_others(self):
+        from unittest import mock
+        from django.core.management.base import CommandError
+        from scheduling.management.commands import auto_generate_schedule
+
+        original = auto_generate_schedule._generate_multi_week_schedule
+        def generate(shops, weeks, area, mode='manual'):
+            if area == self.area1:
+                raise ValueError("boom")
+            return original(shops, weeks, area, mode=mode)
+
+        with mock.patch.object(auto_generate_schedule, '_generate_multi_week_schedule', side_effect=generate):
+            with self.assertRaises(CommandError):
+                self._call()
+
+        schedule = Schedule.objects.get(week_start_date=self.monday)
+        self.assertFalse(Shift.objects.filter(schedule=schedule, shop__area=self.area1).exists())
+        self.assertTrue(Shift.objects.filter(schedule=schedule, shop__area=self.area2).exists())
+        self.assertTrue(schedule.is_published)
+
+    def test_sqlite_runs_areas_one_at_a_time(self):
+        output = self._call('--workers', '4')
+        self.assertIn("one at a time", output)
+        self.assertIn("2 Area(s), 1 worker(s)", output)
+
+    def test_parallel_run_collects_results(self):
+        from concurrent.futures import Future
+        from unittest import mock
+        from scheduling.management.commands import auto_generate_schedule
+
+        class InlineExecutor:
+            # Stands in for the process pool: worker processes cannot see the test database
+            def __init__(self, max_workers, initializer):
+                self.max_workers = max_workers
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc):
+                return False
+            def submit(self, fn, area_id, schedule_id):
+                future = Future()
+                if area_id == self.crashed_area_id:
+                    future.set_exception(RuntimeError("worker died"))
+                else:
+                    future.set_result(fn(area_id, schedule_id))
+                return future
+        InlineExecutor.crashed_area_id = self.area1.id
+
+        schedule = Schedule.objects.create(week_start_date=self.monday)
+        with mock.patch.object(auto_generate_schedule, 'ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(auto_generate_schedule, 'connections'):
+            results = auto_generate_schedule.Command()._run([self.area1, self.area2], schedule, 2)
+
+        by_area = {r['area_id']: r for r in results}
+        self.assertEqual(by_area[self.area1.id]['status'], 'failed')
+        self.assertIn("worker died", by_area[self.area1.id]['error'])
+        self.assertEqual(by_area[self.area2.id]['status'], 'generated')
+        self.assertTrue(Shift.objects.filter(schedule=schedule, shop__area=self.area2).exists())
+
+
+def _legacy_update_scores_for_date(target_date):
+    # Reference copy of the original per-row implementation, used to check the set-based rewrite.
+    def adjust_shop(user, shop, amount):
+        s, _ = UserShopScore.objects.get_or_create(user=user, shop=shop)
+        s.score += amount
+        s.save()
+
+    def adjust_all_shops(user, amount):
+        scores = UserShopScore.objects.filter(user=user)
+        if not scores.exists():
+            for shop in user.applicable_shops.all():
+                UserShopScore.objects.create(user=user, shop=shop, score=100.0 + amount)
+        else:
+            for s in scores:
+                s.score += amount
+                s.save()
+
+    main_shifts = Shift.objects.filter(date=target_date, role='main')
+    for shift in main_shifts:
+        if not TimeLog.objects.filter(user=shift.user, date=target_date).exists():
+            adjust_all_shops(shift.user, 20.0)
+    for shift in Shift.objects.filter(date=target_date, role='backup'):
+        if TimeLog.objects.filter(user=shift.user, date=target_date).exists():
+            adjust_all_shops(shift.user, -20.0)
+        else:
+            adjust_all_shops(shift.user, 10.0)
+    for shift in main_shifts:
+        if TimeLog.objects.filter(user=shift.user, date=target_date).exists():
+            adjust_all_shops(shift.user, -5.0)
+            adjust_shop(shift.user, shift.shop, -2.0)
+
+    for shop_id in set(UserShopScore.objects.values_list('shop', flat=True)):
+        scores = UserShopScore.objects.filter(shop_id=shop_id)
+        avg = sum(s.score for s in scores) / scores.count()
+        delta = 100.0 - avg
+        if abs(delta) > 0.01:
+            for s in scores:
+                s.score += delta
+                s.save()
+
+
+class ScoreHistoryMixin(SchedulingFixtureMixin):
+    def _build_week(self):
+        start_date = datetime.date(2025, 1, 6)
+        schedule = Schedule.objects.create(week_start_date=start_date, is_published=True)
+        _generate_multi_week_schedule([self.roving_shop, self.shop1, self.shop2], [schedule], self.area)
+        # Some duty staff absent, some standby staff substituting
+        for i, shift in enumerate(Shift.objects.filter(schedule=schedule).order_by('id')):
+            if i % 3 != 0:
+                TimeLog.objects.get_or_create(user=shift.user, date=shift.date, defaults={'shop': shift.shop, 'time_in': datetime.time(9, 0)})
+        UserShopScore.objects.create(user=self.u2, shop=self.shop2, score=93.5)
+        return [start_date + datetime.timedelta(days=d) for d in range(7)]
+
+    def _scores(self):
+        from scheduling.utils import load_current_scores
+        return load_current_scores()[0]
+
+
+class UpdateScoresForDateTests(ScoreHistoryMixin, TestCase):
+    def test_matches_legacy_implementation(self):
+        from scheduling.utils import update_scores_for_date, compact_scores
+        dates = self._build_week()
+        # Both start from the same UserShopScore rows
+        compact_scores()
+
+        sid = transaction.savepoint()
+        for d in dates:
+            _legacy_update_scores_for_date(d)
+        expected = self._scores()
+        transaction.savepoint_rollback(sid)
+
+        for d in dates:
+            update_scores_for_date(d)
+        self.assertEqual(self._scores(), expected)
+        self.assertTrue(expected)
+
+    def test_query_count_independent_of_staff(self):
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+        # 3 reads (shifts, timelogs, ledger), then in one transaction: touched shops, snapshot,
+        # last compaction, pending events, applicable shops, event insert, ledger write
+        with self.assertNumQueries(12):
+            update_scores_for_date(dates[0])
+
+    def test_other_shops_are_left_alone(self):
+        from scheduling.models import ScoreEvent
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+        other_area = Area.objects.create(name="Other Area")
+        other_shop = Shop.objects.create(name="Other Shop", is_active=True, area=other_area)
+        outsider = User.objects.create_user(username='out', first_name='Out', last_name='Sider', area=other_area)
+        UserShopScore.objects.create(user=outsider, shop=other_shop, score=80.0)
+
+        update_scores_for_date(dates[0])
+        self.assertFalse(ScoreEvent.objects.filter(shop=other_shop).exclude(reason='initial').exists())
+        self.assertEqual(self._scores()[(outsider.id, other_shop.id)], 80.0)
+
+    def test_rerun_on_unchanged_day_is_noop(self):
+        from scheduling.models import ScoreRunLedger
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        update_scores_for_date(dates[0])
+        expected = self._scores()
+        self.assertEqual(update_scores_for_date(dates[0]), 0)
+        self.assertEqual(self._scores(), expected)
+        self.assertEqual(ScoreRunLedger.objects.filter(date=dates[0]).count(), 1)
+
+    def test_changed_day_is_reversed_and_reapplied(self):
+        from scheduling.utils import update_scores_for_date, compact_scores
+        dates = self._build_week()
+        compact_scores()
+        update_scores_for_date(dates[0])
+
+        # Late edit: an absent duty staff member's TimeLog is entered
+        absent = Shift.objects.filter(date=dates[0], role='main').exclude(user__time_logs__date=dates[0]).first()
+        TimeLog.objects.create(user=absent.user, shop=absent.shop, date=dates[0], time_in=datetime.time(9, 0))
+
+        # Expected: the day applied once on top of the original scores, with the new inputs
+        sid = transaction.savepoint()
+        from scheduling.models import ScoreRunLedger, ScoreEvent
+        ScoreEvent.objects.all().delete()
+        ScoreRunLedger.objects.all().delete()
+        update_scores_for_date(dates[0])
+        expected = self._scores()
+        transaction.savepoint_rollback(sid)
+
+        self.assertGreater(update_scores_for_date(dates[0]), 0)
+        actual = self._scores()
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(actual[key], expected[key])
+
+
+class ScoreEventLogTests(ScoreHistoryMixin, TestCase):
+    def test_updates_only_append_events(self):
+        from scheduling.models import ScoreEvent
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        update_scores_for_date(dates[0])
+        # The snapshot is untouched until compaction
+        self.assertEqual(self._snapshot(), {(self.u2.id, self.shop2.id): 93.5})
+        self.assertTrue(ScoreEvent.objects.filter(date=dates[0], reason='normalization').exists())
+
+    def test_normalization_is_one_event_per_shop(self):
+        from scheduling.models import ScoreEvent
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        update_scores_for_date(dates[0])
+        normalization = ScoreEvent.objects.filter(date=dates[0], reason='normalization')
+        self.assertTrue(normalization.exists())
+        self.assertFalse(normalization.filter(user__isnull=False).exists())
+        self.assertEqual(normalization.count(), normalization.values('shop').distinct().count())
+        # Every shop averages 100 afterwards
+        by_shop = {}
+        for (user_id, shop_id), score in self._scores().items():
+            by_shop.setdefault(shop_id, []).append(score)
+        for scores in by_shop.values():
+            self.assertAlmostEqual(sum(scores) / len(scores), 100.0, delta=0.01)
+
+    def test_compaction_folds_events_into_snapshot(self):
+        from scheduling.models import ScoreCompaction
+        from scheduling.utils import update_scores_for_date, compact_scores
+        dates = self._build_week()
+        for d in dates[:3]:
+            update_scores_for_date(d)
+        current = self._scores()
+        compactions = ScoreCompaction.objects.count()
+
+        compaction = compact_scores(as_of_date=dates[2])
+        self.assertEqual(self._snapshot(), current)
+        self.assertEqual(self._scores(), current)
+        self.assertEqual(compaction.row_count, len(current))
+
+        # Nothing new to fold in
+        self.assertIsNone(compact_scores(as_of_date=dates[2]))
+        self.assertEqual(ScoreCompaction.objects.count(), compactions + 1)
+
+    def test_score_as_of_rebuilds_past_days(self):
+        from scheduling.utils import update_scores_for_date, compact_scores, score_as_of
+        dates = self._build_week()
+        # Starting snapshot holding the score created directly by _build_week
+        compact_scores(keep_snapshot=True)
+
+        expected = {}
+        for i, d in enumerate(dates):
+            update_scores_for_date(d)
+            expected[d] = self._scores()
+            compact_scores(as_of_date=d, keep_snapshot=(i == 2))
+
+        # Replay from the start, from the day 3 snapshot, and past the last snapshot
+        for d in [dates[0], dates[2], dates[4], dates[6]]:
+            rebuilt = score_as_of(d)
+            self.assertEqual(rebuilt.keys(), expected[d].keys())
+            for key in expected[d]:
+                self.assertAlmostEqual(rebuilt[key], expected[d][key])
+
+    def _snapshot(self):
+        return {(s.user_id, s.shop_id): s.score for s in UserShopScore.objects.all()}
+
+
+class ScoreInitializationTests(ScoreHistoryMixin, TestCase):
+    def _started(self):
+        from scheduling.models import ScoreEvent
+        return set(ScoreEvent.objects.filter(reason='initial').values_list('user_id', 'shop_id'))
+
+    def test_assigning_shops_starts_scores(self):
+        # ensure_roving_shop_and_assignments in setUp assigned every user
+        self.assertIn((self.u1.id, self.shop1.id), self._started())
+        self.assertIn((self.sup.id, self.roving_shop.id), self._started())
+
+        shop3 = Shop.objects.create(name="Shop 3", is_active=True, area=self.area)
+        shop3.applicable_staff.add(self.u1, self.u2)
+        self.u3.applicable_shops.add(shop3)
+        for user in [self.u1, self.u2, self.u3]:
+            self.assertIn((user.id, shop3.id), self._started())
+
+    def test_sweep_command_is_idempotent(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from scheduling.models import ScoreEvent
+
+        # Assignments written without signals
+        shop3 = Shop.objects.create(name="Shop 3", is_active=True, area=self.area)
+        User.applicable_shops.through.objects.bulk_create([
+            User.applicable_shops.through(user_id=self.u1.id, shop_id=shop3.id),
+        ])
+        out = StringIO()
+        call_command('init_shop_scores', stdout=out)
+        self.assertIn("Started 1 score(s)", out.getvalue())
+        self.assertIn((self.u1.id, shop3.id), self._started())
+
+        count = ScoreEvent.objects.count()
+        call_command('init_shop_scores', stdout=StringIO())
+        self.assertEqual(ScoreEvent.objects.count(), count)
+
+    def test_nightly_update_does_not_start_scores(self):
+        from scheduling.models import ScoreEvent
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        update_scores_for_date(dates[0])
+        self.assertFalse(ScoreEvent.objects.filter(date=dates[0], reason='initial').exists())
+
+
+class BackfillScoresCommandTests(ScoreHistoryMixin, TestCase):
+    def _call(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('backfill_scores', *args, stdout=out)
+        return out.getvalue()
+
+    def test_backfill_matches_daily_runs(self):
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        sid = transaction.savepoint()
+        for d in dates:
+            update_scores_for_date(d)
+        expected = self._scores()
+        transaction.savepoint_rollback(sid)
+
+        output = self._call('--from', str(dates[0]), '--to', str(dates[-1]), '--batch-size', '3')
+        self.assertEqual(self._scores(), expected)
+        self.assertIn("Backfill complete: 7 day(s)", output)
+
+    def test_no_snapshot_mixes_in_later_days(self):
+        from scheduling.models import ScoreCompaction, ScoreEvent
+        from scheduling.utils import update_scores_for_date, score_as_of, _replay_events
+        dates = self._build_week()
+        update_scores_for_date(dates[5]) # Processed before the backfill of the days before it
+
+        self._call('--from', str(dates[0]), '--to', str(dates[2]))
+        self.assertFalse(ScoreCompaction.objects.filter(has_snapshot=True, as_of_date__lt=dates[5]).exists())
+
+        expected = {}
+        _replay_events(expected, ScoreEvent.objects.filter(date__lte=dates[2]).order_by('id').values_list('user_id', 'shop_id', 'delta'))
+        rebuilt = score_as_of(dates[2])
+        self.assertEqual(rebuilt.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(rebuilt[key], expected[key])
+
+    def test_resumes_from_checkpoint(self):
+        from unittest import mock
+        from scheduling.models import ScoreBackfill
+        from scheduling.utils import update_scores_for_date
+        dates = self._build_week()
+
+        sid = transaction.savepoint()
+        for d in dates:
+            update_scores_for_date(d)
+        expected = self._scores()
+        transaction.savepoint_rollback(sid)
+
+        # Fail on the 5th day: days 1-3 are committed as the first batch, days 4-5 roll back
+        calls = []
+        def failing_update(target_date, inputs=None):
+            calls.append(target_date)
+            if len(calls) == 5:
+                raise RuntimeError("interrupted")
+            return update_scores_for_date(target_date, inputs=inputs)
+
+        with mock.patch('scheduling.management.commands.backfill_scores.update_scores_for_date', side_effect=failing_update):
+            with self.assertRaises(RuntimeError):
+                self._call('--from', str(dates[0]), '--to', str(dates[-1]), '--batch-size', '3')
+
+        backfill = ScoreBackfill.objects.get()
+        self.assertEqual(backfill.last_processed_date, dates[2])
+        self.assertIsNone(backfill.completed_at)
+
+        output = self._call('--from', str(dates[0]), '--to', str(dates[-1]), '--batch-size', '3')
+        self.assertIn(f"Resuming from {dates[3]}", output)
+        self.assertEqual(self._scores(), expected)
+        backfill.refresh_from_db()
+        self.assertEqual(backfill.days_processed, 7)
+        self.assertIsNotNone(backfill.completed_at)
+
+
+class ScheduleGridCacheTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate_week()
+        self.client.force_login(self.u1)
+
+    def test_repeat_views_hit_cache(self):
+        self.client.get(reverse('scheduling:my_schedule'))
+        self.client.get(reverse('scheduling:my_schedule'))
+        stats = grid_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_stats_view(self):
+        self.client.get(reverse('scheduling:my_schedule'))
+        self.client.get(reverse('scheduling:my_schedule'))
+        url = reverse('scheduling:schedule_grid_stats')
+        self.assertEqual(self.client.get(url).status_code, 302) # Administrators only
+
+        admin = User.objects.create_user(username='adm', first_name='Ad', last_name='M', tier='administrator')
+        self.client.force_login(admin)
+        stats = self.client.get(url).json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertGreater(stats['last_rebuild_ms'], 0)
+
+    def test_admin_modal_search_scoped_to_area(self):
+        admin = User.objects.create_user(username='adm', first_name='Ad', last_name='M', tier='administrator', area=self.area)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('scheduling:my_schedule'))
+        self.assertContains(response, f"{reverse('accounts:user_search')}?area_id={self.area.id}")
+
+    def test_writes_invalidate_grid(self):
+        today = timezone.localdate()
+
+        self.client.get(reverse('scheduling:my_schedule'))
+        shift = Shift.objects.filter(schedule=self.schedule, date=today, role='main').exclude(shop=self.roving_shop).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(user=shift.user, shop=shift.shop, date=today, time_in=datetime.time(9, 0))
+
+        response = self.client.get(reverse('scheduling:my_schedule'))
+        self.assertEqual(grid_cache_stats()['misses'], 2)
+        cell = response.context['schedules_data'][0]['matrix'][today][shift.shop_id]['main']
+        self.assertEqual([s.status for s in cell if s.user == shift.user], ['ongoing'])
+
+    def test_generation_invalidates_grid(self):
+        self.client.get(reverse('scheduling:my_schedule'))
+        _generate_multi_week_schedule([self.roving_shop, self.shop1, self.shop2], [self.schedule], self.area)
+        self.client.get(reverse('scheduling:my_schedule'))
+        self.assertEqual(grid_cache_stats()['misses'], 2)
+
+    def test_writes_bump_once_per_commit(self):
+        week_start = self.schedule.week_start_date
+        version = get_grid_version(week_start)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for user in (self.u1, self.u2, self.u3):
+                Shift.objects.create(schedule=self.schedule, user=user, shop=self.shop1, date=week_start, role='backup')
+            Shift.objects.filter(schedule=self.schedule, date=week_start, role='backup', shop=self.shop1).delete()
+        # One bump of the week for the whole transaction
+        self.assertEqual([c.key for c in callbacks if c.key.startswith('schedule_grid:')], [f'schedule_grid:{week_start}'])
+        self.assertEqual(get_grid_version(week_start), version + 1)
+
+    def test_generation_bumps_versions_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            _generate_multi_week_schedule([self.roving_shop, self.shop1, self.shop2], [self.schedule], self.area)
+        bumps = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "scheduling_cacheversion"')]
+        self.assertEqual(len(bumps), 2) # The week's grid and the feeds
+
+    def test_bump_from_another_process_invalidates_grid(self):
+        self.client.get(reverse('scheduling:my_schedule'))
+        # What bump_grid_version in a command or the ASGI server leaves behind: only the row changes
+        CacheVersion.objects.filter(key=f'schedule_grid:{self.schedule.week_start_date}').update(version=F('version') + 1)
+        self.client.get(reverse('scheduling:my_schedule'))
+        self.assertEqual(grid_cache_stats()['misses'], 2)
+
+    def test_history_detail_uses_same_grid(self):
+        self.client.get(reverse('scheduling:my_schedule'))
+        response = self.client.get(reverse('scheduling:schedule_history_detail', args=[self.schedule.id]))
+        self.assertEqual(response.status_code, 200)
+        # Active shops only on my_schedule, all shops on history: same columns here, so one build
+        self.assertEqual(grid_cache_stats()['misses'], 1)
+
+    def test_grid_reads_only_visible_shops(self):
+        today = timezone.localdate()
+        other_area = Area.objects.create(name="Other Area")
+        other_shop = Shop.objects.create(name="Other Shop", is_active=True, area=other_area)
+        outsider = User.objects.create_user(username='out', first_name='Out', last_name='O', area=other_area)
+        TimeLog.objects.create(user=outsider, shop=other_shop, date=today, time_in=datetime.time(9, 0))
+
+        shops = [self.roving_shop, self.shop1, self.shop2]
+        with self.assertNumQueries(2):
+            grid = build_schedule_grid(self.schedule, shops, today)
+            names = [r.user.get_short_name_for_schedule for cells in grid['matrix'].values() for cell in cells.values() for r in cell['main'] + cell['backup']]
+        self.assertTrue(names)
+        self.assertNotIn(outsider.get_short_name_for_schedule, names)
+
+
+class HistoryFragmentCacheTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate_week(weeks_ago=1)
+        self.url = reverse('scheduling:schedule_history_detail', args=[self.schedule.id])
+        self.client.force_login(self.u1)
+
+    def test_past_week_served_from_fragment(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first.context['grid_html'], second.context['grid_html'])
+        # The grid was built and rendered once; the second view did not even look it up
+        stats = grid_cache_stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 0))
+
+    def test_timelog_write_invalidates_fragment(self):
+        self.client.get(self.url)
+        shift = Shift.objects.filter(schedule=self.schedule, role='main').exclude(shop=self.roving_shop).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(user=shift.user, shop=shift.shop, date=shift.date, time_in=datetime.time(9, 0))
+
+        self.client.get(self.url)
+        self.assertEqual(grid_cache_stats()['misses'], 2)
+
+    def test_fragment_scoped_by_area(self):
+        other_area = Area.objects.create(name="Other Area")
+        Shop.objects.create(name="Other Shop", is_active=True, area=other_area)
+        admin = User.objects.create_user(username='admin2', tier='administrator', area=self.area)
+
+        self.client.get(self.url)
+        self.client.force_login(admin)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Other Shop")
+
+
+class ConditionalScheduleGetTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate_week()
+        self.client.force_login(self.u1)
+
+    def test_my_schedule_not_modified(self):
+        url = reverse('scheduling:my_schedule')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Answered without touching the grid
+        self.assertEqual(grid_cache_stats()['hits'], 0)
+
+    def test_my_schedule_etag_changes_on_write(self):
+        url = reverse('scheduling:my_schedule')
+        etag = self.client.get(url)['ETag']
+        shift = Shift.objects.filter(schedule=self.schedule, role='main').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(user=shift.user, shop=shift.shop, date=shift.date, time_in=datetime.time(9, 0))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_is_per_viewer(self):
+        url = reverse('scheduling:my_schedule')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.u2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_past_history_week_cached_long(self):
+        past = Schedule.objects.create(week_start_date=self.schedule.week_start_date - datetime.timedelta(days=7), is_published=True)
+        url = reverse('scheduling:schedule_history_detail', args=[past.id])
+        response = self.client.get(url)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        current = self.client.get(reverse('scheduling:schedule_history_detail', args=[self.schedule.id]))
+        self.assertIn('no-cache', current['Cache-Control'])
+
+
+class ScheduleJsonTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.generate_week()
+        self.url = reverse('scheduling:schedule_json', args=[self.schedule.id, self.area.id])
+        self.client.force_login(self.u1)
+
+    def test_columnar_rows(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['schedule']['id'], self.schedule.id)
+        self.assertEqual([s[1] for s in data['shops']][0], 'Roving')
+        self.assertEqual(len(data['rows']), Shift.objects.filter(schedule=self.schedule).count())
+
+        shift = Shift.objects.filter(schedule=self.schedule).select_related('shop', 'user').first()
+        row = next(r for r in data['rows'] if r[6] == shift.id)
+        day, shop, user, role = row[:4]
+        self.assertEqual(data['dates'][day], shift.date.isoformat())
+        self.assertEqual(data['shops'][shop], [shift.shop.id, shift.shop.name])
+        self.assertEqual(data['users'][user][0], shift.user.id)
+        self.assertEqual(data['roles'][role], shift.role)
+
+    def test_filters(self):
+        date = self.schedule.week_start_date + datetime.timedelta(days=2)
+        data = self.client.get(self.url, {'user': self.u1.id, 'from': date, 'to': date}).json()
+        expected = Shift.objects.filter(schedule=self.schedule, user=self.u1, date=date).count()
+        self.assertEqual(len(data['rows']), expected)
+        self.assertTrue(all(data['users'][r[2]][0] == self.u1.id for r in data['rows']))
+
+        self.assertEqual(self.client.get(self.url, {'from': 'tomorrow'}).status_code, 400)
+
+    def test_other_area_hidden(self):
+        other_area = Area.objects.create(name="Other Area")
+        response = self.client.get(reverse('scheduling:schedule_json', args=[self.schedule.id, other_area.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.force_login(self.u2)
+        # Not per viewer: the same area data validates for a colleague
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ScheduleHistoryListTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        today = timezone.localdate()
+        this_week = today - datetime.timedelta(days=today.weekday())
+        self.weeks = [Schedule.objects.create(week_start_date=this_week - datetime.timedelta(weeks=i), is_published=True) for i in range(15)]
+        self.client.force_login(self.sup)
+
+    def test_page_query_uses_index(self):
+        older = Schedule.objects.filter(is_published=True, week_start_date__lt=self.weeks[3].week_start_date)
+        plan = older.order_by('-week_start_date')[:13].explain()
+        self.assertIn('week_start_date', plan) # USING INDEX scheduling_schedule_week_start_date_...
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_keyset_pages(self):
+        url = reverse('scheduling:schedule_history_list')
+        first = self.client.get(url)
+        self.assertEqual(first.context['schedules'], self.weeks[:HISTORY_PAGE_SIZE])
+        self.assertIsNone(first.context['newer_after'])
+
+        second = self.client.get(url, {'before': first.context['older_before']})
+        self.assertEqual(second.context['schedules'], self.weeks[HISTORY_PAGE_SIZE:])
+        self.assertIsNone(second.context['older_before'])
+
+        back = self.client.get(url, {'after': second.context['newer_after']})
+        self.assertEqual(back.context['schedules'], self.weeks[:HISTORY_PAGE_SIZE])
+
+    def test_week_stats(self):
+        week = self.weeks[1] # Last week: every shift is due
+        days = [week.week_start_date + datetime.timedelta(days=i) for i in range(3)]
+        for d in days:
+            Shift.objects.create(schedule=week, user=self.u1, shop=self.shop1, date=d, role='main')
+        Shift.objects.create(schedule=week, user=self.u2, shop=self.roving_shop, date=days[0], role='backup')
+        TimeLog.objects.create(user=self.u1, shop=self.shop1, date=days[0], time_in=datetime.time(9, 0), time_out=datetime.time(17, 0))
+        TimeLog.objects.create(user=self.u2, shop=self.shop1, date=days[1], time_in=datetime.time(9, 0), time_out=datetime.time(17, 0))
+
+        response = self.client.get(reverse('scheduling:schedule_history_list'))
+        stats = next(s for s in response.context['schedules'] if s.id == week.id).stats
+        self.assertEqual((stats['duty_shifts'], stats['absences'], stats['substitutions']), (3, 2, 1))
+        self.assertEqual(stats['coverage'], 66.7)
+
+
+class CalendarFeedTests(SchedulingFixtureMixin, TestCase):
+    def setUp(self):
+        # Run the version bumps now: TestCase never commits, and pending ones would absorb the tests' own
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            today = timezone.localdate()
+            self.schedule = Schedule.objects.create(week_start_date=today - datetime.timedelta(days=today.weekday()), is_published=True)
+            self.shift = Shift.objects.create(schedule=self.schedule, user=self.u1, shop=self.shop1, date=today, role='main')
+            ShopOperatingHours.objects.create(shop=self.shop1, day=today.weekday(), open_time=datetime.time(9, 0), close_time=datetime.time(18, 0))
+            draft = Schedule.objects.create(week_start_date=self.schedule.week_start_date + datetime.timedelta(days=7))
+            Shift.objects.create(schedule=draft, user=self.u1, shop=self.shop2, date=draft.week_start_date, role='main')
+            self.feed = rotate_feed_token(self.u1)
+        cache.clear()
+        self.url = reverse('scheduling:calendar_feed', args=[self.feed.token])
+
+    def test_published_shifts_with_hours(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:shift-{self.shift.id}@imdiz-hris', body)
+        self.assertIn('SUMMARY:Duty @ Shop 1', body)
+        # 09:00 in Manila is 01:00 UTC
+        self.assertIn(f"DTSTART:{self.shift.date:%Y%m%d}T010000Z", body)
+
+    def test_unchanged_feed_is_not_rebuilt(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0): # Token owner and feed version come from the cache
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_shift_change_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.shift.shop = self.shop2
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:Duty @ Shop 2', response.content.decode())
+
+    def test_rotation_revokes_token(self):
+        self.client.get(self.url)
+        self.client.force_login(self.u1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('scheduling:calendar_feed_rotate'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_inactive_user_has_no_feed(self):
+        self.client.get(self.url)
+        self.u1.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.u1.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_other_process_bump_seen_after_max_age(self):
+        etag = self.client.get(self.url)['ETag']
+        CacheVersion.objects.filter(key=VERSION_KEY).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cache.delete(f'version:{VERSION_KEY}') # What VERSION_MAX_AGE expiring does
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class GeneratorViewTests(SchedulingFixtureMixin, TestCase):
+    def test_rows_carry_counts_and_urls(self):
+        self.client.force_login(self.sup)
+        self.client.post(reverse('scheduling:generator'), {'generate': '1'})
+        week = Schedule.objects.order_by('week_start_date').first()
+
+        response = self.client.get(reverse('scheduling:generator'))
+        self.assertEqual(response.status_code, 200)
+        row = response.context['weeks_data'][0]['rows'][0]
+        self.assertEqual([cell.shop for cell in row.cells], [self.roving_shop, self.shop1, self.shop2])
+        self.assertTrue(row.cells[0].is_roving)
+        shift = row.cells[1].main[0]
+        self.assertEqual(shift.duty_count, Shift.objects.filter(schedule=week, user=shift.user, role='main').count())
+        self.assertEqual(shift.delete_url, reverse('scheduling:shift_delete', args=[shift.id]))
+        self.assertEqual(row.cells[0].add_backup_url, reverse('scheduling:shift_add', args=[week.id, row.date.isoformat(), self.roving_shop.id, 'backup']))
+
+    def test_staff_totals_per_week(self):
+        self.client.force_login(self.sup)
+        self.client.post(reverse('scheduling:generator'), {'generate': '1'})
+        response = self.client.get(reverse('scheduling:generator'))
+        weeks = [w['schedule'] for w in response.context['weeks_data']]
+
+        row = next(r for r in response.context['staff_totals'] if r.user == self.u1)
+        expected = [
+            (Shift.objects.filter(schedule=w, user=self.u1, role='main').count(),
+             Shift.objects.filter(schedule=w, user=self.u1, role='backup').count())
+            for w in weeks
+        ]
+        self.assertEqual(row.weeks, expected)
+        self.assertEqual(row.duty, sum(d for d, _ in expected))
+        self.assertEqual(row.standby, sum(s for _, s in expected))
+
+    def test_later_weeks_load_on_demand(self):
+        self.client.force_login(self.sup)
+        self.client.post(reverse('scheduling:generator'), {'generate': '1'})
+        response = self.client.get(reverse('scheduling:generator'))
+        weeks = response.context['weeks_data']
+        self.assertIn('rows', weeks[0])
+        self.assertTrue(all('rows' not in w for w in weeks[1:]))
+
+        response = self.client.get(weeks[1]['lazy_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['week']['schedule'], weeks[1]['schedule'])
+        self.assertContains(response, self.u1.get_short_name_for_schedule)
+
+        self.client.force_login(self.u1)
+        self.assertEqual(self.client.get(weeks[1]['lazy_url']).status_code, 403)
+
+    def test_get_does_not_write(self):
+        self.client.force_login(self.sup)
+        # Session, user, area, schedules, shops (2), last run: reads only
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('scheduling:generator'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Schedule.objects.exists())
+        self.assertTrue(all(w['schedule'].pk is None and w['rows'] for w in response.context['weeks_data']))
+
+        self.client.post(reverse('scheduling:generator'), {'generate': '1'})
+        self.assertEqual(Schedule.objects.count(), 4)
+
+    def test_admin_generate_redirects_to_area(self):
+        admin = User.objects.create_user(username='adm', first_name='Ad', last_name='M', is_active=True, is_approved=True, tier='administrator')
+        self.client.force_login(admin)
+        url = f"{reverse('scheduling:generator')}?area_id={self.area.id}"
+        response = self.client.post(url, {'generate': '1'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+
+class ReconcileWeekTests(TestCase):
+    def test_statuses(self):
+        today = datetime.date(2025, 1, 8)
+        yesterday = today - datetime.timedelta(days=1)
+        tomorrow = today + datetime.timedelta(days=1)
+        dates = [yesterday, today, tomorrow]
+        shop, roving = NS(id=1), NS(id=2)
+        users = {i: NS(id=i) for i in range(1, 9)}
+
+        def shift(id, user_id, shop_id, date, role='main'):
+            return NS(id=id, user=users[user_id], user_id=user_id, shop_id=shop_id, date=date, role=role)
+
+        def log(user_id, shop_id, date, time_out=True):
+            return NS(user=users[user_id], user_id=user_id, shop_id=shop_id, date=date,
+                      time_in=datetime.time(9, 0), time_out=datetime.time(17, 0) if time_out else None)
+
+        shifts = [
+            shift(1, 1, 1, yesterday), # reported
+            shift(2, 2, 1, yesterday), # absent, substituted by user 5
+            shift(3, 3, 1, yesterday), # absent
+            shift(4, 4, 1, yesterday, 'backup'),
+            shift(5, 1, 1, today), # ongoing
+            shift(6, 2, 1, tomorrow), # not due
+            shift(7, 6, 2, yesterday), # incomplete
+            shift(8, 4, 2, today, 'backup'), # standby reported
+        ]
+        logs = [
+            log(1, 1, yesterday), log(5, 1, yesterday), log(1, 1, today, time_out=False),
+            log(6, 2, yesterday, time_out=False), log(4, 2, today), log(7, 1, today),
+        ]
+        matrix = reconcile_week(dates, [shop, roving], shifts, logs, today)
+
+        cell = matrix[yesterday][1]['main']
+        self.assertEqual([(r.id, r.status) for r in cell], [(1, 'reported'), (2, 'substituted'), (3, 'absent')])
+        self.assertEqual(cell[1].actual_user, users[5])
+        self.assertEqual([r.status for r in matrix[yesterday][1]['backup']], [''])
+        self.assertEqual([(r.id, r.status) for r in matrix[today][1]['main']], [(5, 'ongoing'), (None, 'supplement')])
+        self.assertEqual([r.status for r in matrix[tomorrow][1]['main']], [''])
+        self.assertEqual([r.status for r in matrix[yesterday][2]['main']], ['incomplete'])
+        self.assertEqual([r.status for r in matrix[today][2]['backup']], ['reported'])
+        # The standby's log at Roving also lists them as a supplement there
+        self.assertEqual([(r.role, r.user) for r in matrix[today][2]['main']], [('supplement', users[4])])
@@ -135,3 +135,78 @@ class ScheduleRevampTests(TestCase):
         # Expected: 15.0
         score, _ = calculate_assignment_score(user_pref, self.shop1, today, history_data, current_assignments)
         self.assertEqual(score, 15.0)
+
+
+class ScoringRuleRegistryTests(TestCase):
+    def setUp(self):
+        from accounts.models import Area
+        self.area = Area.objects.create(name="Area 1")
+        self.other_area = Area.objects.create(name="Area 2")
+        self.shop = Shop.objects.create(name="Shop 1", is_active=True, area=self.area)
+        self.user = User.objects.create(username="user1", first_name="User", last_name="One", tier='regular', is_approved=True, area=self.area)
+        self.today = datetime.date(2023, 10, 25) # A Wednesday
+        self.history_data = {
+            'prev_week_logs': [],
+            'past_3_weeks_logs': [],
+            'prev_week_shifts': []
+        }
+
+    def test_default_weights_match_breakdown_labels(self):
+        from scheduling.scoring import RULE_REGISTRY, compile_scoring_rules
+        current_assignments = CurrentWeekAssignments()
+        scorer = compile_scoring_rules(self.area)
+
+        # Base 20 + 10 (Mon and Tue off)
+        score, breakdown = calculate_assignment_score(self.user, self.shop, self.today, self.history_data, current_assignments, scorer=scorer)
+        self.assertEqual(score, 30.0)
+        self.assertEqual(breakdown, {'Base Score': 20.0, '2+ Days Off Bonus': 10.0})
+        self.assertEqual(RULE_REGISTRY['two_days_off'].label, '2+ Days Off Bonus')
+
+    def test_area_weights_override_global_and_defaults(self):
+        from scheduling.models import ScoringRule
+        from scheduling.scoring import compile_scoring_rules
+        ScoringRule.objects.create(area=None, code='base', weight=30.0)
+        ScoringRule.objects.create(area=None, code='two_days_off', weight=5.0)
+        ScoringRule.objects.create(area=self.area, code='two_days_off', weight=0.0)
+
+        current_assignments = CurrentWeekAssignments()
+
+        # Area 1: Base 30 (global), Days Off bonus disabled by Area row
+        score, breakdown = calculate_assignment_score(self.user, self.shop, self.today, self.history_data, current_assignments, scorer=compile_scoring_rules(self.area))
+        self.assertEqual(score, 30.0)
+        self.assertNotIn('2+ Days Off Bonus', breakdown)
+
+        # Area 2: Base 30 + 5 (global rows only)
+        score, _ = calculate_assignment_score(self.user, self.shop, self.today, self.history_data, current_assignments, scorer=compile_scoring_rules(self.other_area))
+        self.assertEqual(score, 35.0)
+
+    def test_unknown_code_rejected(self):
+        from django.core.exceptions import ValidationError
+        from scheduling.models import ScoringRule
+        with self.assertRaises(ValidationError):
+            ScoringRule(area=self.area, code='two_day_off', weight=1.0).full_clean()
+        ScoringRule(area=self.area, code='two_days_off', weight=1.0).full_clean()
+
+    def test_one_default_row_per_code(self):
+        from django.db import IntegrityError, transaction
+        from scheduling.models import ScoringRule
+        ScoringRule.objects.create(area=None, code='base', weight=30.0)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ScoringRule.objects.create(area=None, code='base', weight=40.0)
+
+    def test_regenerate_uses_area_weights(self):
+        from unittest import mock
+        from django.urls import reverse
+        from scheduling.models import ScoringRule
+        ScoringRule.objects.create(area=self.area, code='base', weight=99.0)
+        self.user.applicable_shops.add(self.shop)
+        supervisor = User.objects.create(username="sup", first_name="Sup", last_name="Visor", tier='supervisor', is_approved=True, area=self.area)
+        monday = datetime.date(2023, 10, 23)
+        schedule = Schedule.objects.create(week_start_date=monday)
+
+        self.client.force_login(supervisor)
+        with mock.patch('django.utils.timezone.localdate', return_value=monday):
+            self.client.get(reverse('scheduling:regenerate_remaining_week', args=[schedule.id]))
+
+        shift = Shift.objects.filter(schedule=schedule, shop=self.shop, user=self.user).first()
+        self.assertEqual(shift.score_breakdown['Base Score'], 99.0)
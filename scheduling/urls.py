@@ -5,14 +5,19 @@ app_name = 'scheduling'
 
 urlpatterns = [
     path('preferences/', views.preferences, name='preferences'),
+    path('calendar/rotate/', views.calendar_feed_rotate, name='calendar_feed_rotate'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
     path('my-schedule/', views.my_schedule, name='my_schedule'),
     path('generator/', views.generator, name='generator'),
+    path('generator/week/<int:schedule_id>/', views.generator_week, name='generator_week'),
     path('shift/delete/<int:shift_id>/', views.shift_delete, name='shift_delete'),
     path('shift/add/<int:schedule_id>/<str:date>/<int:shop_id>/<str:role>/', views.shift_add, name='shift_add'),
     path('history/', views.schedule_history_list, name='schedule_history_list'),
     path('history/<int:schedule_id>/', views.schedule_history_detail, name='schedule_history_detail'),
+    path('api/schedule/<int:schedule_id>/area/<int:area_id>/', views.schedule_json, name='schedule_json'),
     path('regenerate-remaining/<int:schedule_id>/', views.regenerate_remaining_week, name='regenerate_remaining_week'),
     path('shift/update/<int:shift_id>/', views.shift_update, name='shift_update'),
+    path('stats/grid-cache/', views.schedule_grid_stats, name='schedule_grid_stats'),
     path('load-test/', views.load_test_data, name='load_test_data'),
     path('reset-data/', views.reset_data, name='reset_data'),
 ]
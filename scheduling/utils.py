@@ -1,9 +1,13 @@
 from django.utils import timezone
 import datetime
-from scheduling.models import Shift, UserShopScore, Preference
+import hashlib
+import json
+from scheduling.models import Shift, UserShopScore, ScoreRunLedger, ScoreEvent, ScoreCompaction, ScoreSnapshot
 from attendance.models import TimeLog
 from attendance.models import Shop
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Max
+from scheduling.scoring import DEFAULT_SCORER, HistoryIndex
 
 def ensure_roving_shop_and_assignments():
     from accounts.models import User, Area
@@ -46,151 +50,27 @@ def ensure_roving_shop_and_assignments():
 
         user.applicable_shops.set(target_applicable)
 
-def calculate_assignment_score(user, shop, date, history_data, current_week_assignments, min_duty_count_among_eligible=None, use_attendance_history=True):
+def calculate_assignment_score(user, shop, date, history_data, current_week_assignments, min_duty_count_among_eligible=None, use_attendance_history=True, scorer=None):
     """
     Calculates the score for assigning 'user' to 'shop' on 'date' as Duty Staff.
     Returns tuple (score, breakdown_dict)
 
     history_data:
-      - prev_week_logs: QuerySet or List of TimeLog for the previous week
-      - past_3_weeks_logs: QuerySet or List of TimeLog for the 3 weeks prior to previous week
-      - prev_week_shifts: QuerySet or List of Shift for the previous week
+      - A HistoryIndex, or a dict with prev_week_logs, past_3_weeks_logs and prev_week_shifts
+        (indexed on every call, so generation loops should build the HistoryIndex once).
 
     current_week_assignments:
-      - Dictionary or Helper Object containing current week's assignments so far.
-        Must support querying:
-        - user's duty count
-        - user's assignments (shop, date)
+      - CurrentWeekAssignments holding the current week's assignments so far.
+
+    scorer:
+      - CompiledScorer from compile_scoring_rules(area). Defaults to the code default weights.
     """
-    score = 20.0  # a. Base score
-    breakdown = {'Base Score': 20.0}
-
-    # Helper to check if log matches shop
-    def log_matches_shop(log, shop_id):
-        # Handle case where log.shop might be None or ID
-        if not log.shop: return False
-        return log.shop.id == shop_id
-
-    # b. Deduct 1 point for each day of the previous week that the staff reported (timed-in) to the same shop.
-    if use_attendance_history:
-        deduction = 0
-        for log in history_data['prev_week_logs']:
-            if log.user_id == user.id and log_matches_shop(log, shop.id):
-                deduction += 1.0
-        if deduction > 0:
-            score -= deduction
-            breakdown['Prev Week Same Shop Attendance'] = -deduction
-
-    # c. Deduct 1 point for each week from the past 3 weeks, not counting the previous, that the staff reported at least once (timed-in) to the same shop.
-    if use_attendance_history:
-        weeks_worked = set()
-        for log in history_data['past_3_weeks_logs']:
-            if log.user_id == user.id and log_matches_shop(log, shop.id):
-                weeks_worked.add(log.date.isocalendar()[:2])
-        deduction = len(weeks_worked) * 1.0
-        if deduction > 0:
-            score -= deduction
-            breakdown['Past 3 Weeks Same Shop Attendance'] = -deduction
-
-    # d. Deduct 1 point for each day of the previous week that the staff timed-in.
-    if use_attendance_history:
-        deduction = 0
-        for log in history_data['prev_week_logs']:
-            if log.user_id == user.id:
-                deduction += 1.0
-        if deduction > 0:
-            score -= deduction
-            breakdown['Prev Week Attendance (Any Shop)'] = -deduction
-
-    # e. Deduct 2 points for each time the staff was assigned as Duty Staff in the same week.
-    current_duty_count = current_week_assignments.get_duty_count(user.id)
-    deduction = current_duty_count * 2.0
-    if deduction > 0:
-        score -= deduction
-        breakdown['Current Week Duty Assignments'] = -deduction
-
-    # f. Deduct 1 point if staff's preferred day off matches the current day.
-    try:
-        pref = user.preference
-        if pref.top_preferred_day_off == date.weekday():
-            score -= 5.0
-            breakdown['Preferred Day Off'] = -5.0
-    except Preference.DoesNotExist:
-        pass
-
-    # g. Deduct 2 points for each day staff acted as substitute in the past week.
-    if use_attendance_history:
-        sub_count = 0
-        worked_dates = set()
-        for log in history_data['prev_week_logs']:
-            if log.user_id == user.id:
-                worked_dates.add(log.date)
-
-        for shift in history_data['prev_week_shifts']:
-            if shift.user_id == user.id and shift.role == 'backup':
-                if shift.date in worked_dates:
-                    sub_count += 1
-        deduction = sub_count * 2.0
-        if deduction > 0:
-            score -= deduction
-            breakdown['Prev Week Substitutions'] = -deduction
-
-    # h. Deduct another 4 points if the staff has been assigned as Duty Staff for the 6th time...
-    if current_duty_count >= 6:
-        score -= 4.0
-        breakdown['6+ Duty Assignments'] = -4.0
-
-    # i. Add 4 points for each day staff was absent in the past week.
-    if use_attendance_history:
-        absent_count = 0
-        worked_dates = set()
-        for log in history_data['prev_week_logs']:
-            if log.user_id == user.id:
-                worked_dates.add(log.date)
-
-        for shift in history_data['prev_week_shifts']:
-            if shift.user_id == user.id and shift.role == 'main':
-                if shift.date not in worked_dates:
-                    absent_count += 1
-        addition = absent_count * 4.0
-        if addition > 0:
-            score += addition
-            breakdown['Prev Week Absences'] = addition
-
-    # k. Add 1 point to all user/s with the fewest assigned shift in the current week
-    if min_duty_count_among_eligible is not None:
-        if current_duty_count == min_duty_count_among_eligible:
-            score += 1.0
-            breakdown['Fewest Shifts Bonus'] = 1.0
-
-    # +1 if user is assigned to the same shop the previous day within the week
-    prev_day_date = date - datetime.timedelta(days=1)
-    was_at_same_shop_prev_day = False
-    for uid, sid, d in current_week_assignments.assignments:
-        if uid == user.id and sid == shop.id and d == prev_day_date:
-            was_at_same_shop_prev_day = True
-            break
-    if was_at_same_shop_prev_day:
-        score += 1.0
-        breakdown['Consecutive Day Same Shop Bonus'] = 1.0
-
-    # +10.0 if user already has 2 days off in the current week
-    days_to_check = []
-    current_weekday = date.weekday() # 0=Mon, ...
-    for i in range(current_weekday):
-        check_date = date - datetime.timedelta(days=(current_weekday - i))
-        days_to_check.append(check_date)
-
-    days_off_count = 0
-    for d in days_to_check:
-        if not current_week_assignments.is_assigned_on_day(user.id, d):
-            days_off_count += 1
-
-    if days_off_count >= 2:
-        score += 10.0
-        breakdown['2+ Days Off Bonus'] = 10.0
-
-    return score, breakdown
+    if scorer is None:
+        scorer = DEFAULT_SCORER
+    if not isinstance(history_data, HistoryIndex):
+        history_data = HistoryIndex(history_data)
+
+    return scorer.score(user, shop, date, history_data, current_week_assignments, min_duty_count_among_eligible, use_attendance_history)
 
 
 class CurrentWeekAssignments:
@@ -198,6 +78,8 @@ class CurrentWeekAssignments:
         self.duty_counts = {} # user_id -> count
         self.shop_counts = {} # user_id -> {shop_id -> count}
         self.assignments = [] # list of (user_id, shop_id, date)
+        self.assigned_days = set() # (user_id, date)
+        self.assigned_shop_days = set() # (user_id, shop_id, date)
 
     def add_assignment(self, user_id, shop_id, date):
         self.duty_counts[user_id] = self.duty_counts.get(user_id, 0) + 1
@@ -207,6 +89,8 @@ class CurrentWeekAssignments:
         self.shop_counts[user_id][shop_id] = self.shop_counts[user_id].get(shop_id, 0) + 1
 
         self.assignments.append((user_id, shop_id, date))
+        self.assigned_days.add((user_id, date))
+        self.assigned_shop_days.add((user_id, shop_id, date))
 
     def get_duty_count(self, user_id):
         return self.duty_counts.get(user_id, 0)
@@ -217,60 +101,356 @@ class CurrentWeekAssignments:
         return 0
 
     def is_assigned_on_day(self, user_id, date):
-        for uid, sid, d in self.assignments:
-            if uid == user_id and d == date:
-                return True
-        return False
+        return (user_id, date) in self.assigned_days
+
+    def is_assigned_to_shop_on_day(self, user_id, shop_id, date):
+        return (user_id, shop_id, date) in self.assigned_shop_days
+
+# Score adjustments applied by update_scores_for_date
+MISSED_DUTY_ADJUSTMENT = 20.0
+STANDBY_WORKED_ADJUSTMENT = -20.0
+STANDBY_IDLE_ADJUSTMENT = 10.0
+DUTY_WORKED_ADJUSTMENT = -5.0
+DUTY_WORKED_SHOP_ADJUSTMENT = -2.0
+
+def ensure_score_rows(user_ids=None):
+    """
+    Starts a score of 100 (an 'initial' ScoreEvent) for every applicable shop of the users
+    (all users when None) that has no score yet. Returns the number of scores started.
+    """
+    from accounts.models import User
+
+    pairs = User.applicable_shops.through.objects.all()
+    scores = UserShopScore.objects.all()
+    initial = ScoreEvent.objects.filter(reason='initial')
+    if user_ids is not None:
+        pairs = pairs.filter(user_id__in=user_ids)
+        scores = scores.filter(user_id__in=user_ids)
+        initial = initial.filter(user_id__in=user_ids)
+
+    existing = set(scores.values_list('user_id', 'shop_id')) | set(initial.values_list('user_id', 'shop_id'))
+    today = timezone.localdate()
+    new_events = [
+        ScoreEvent(user_id=user_id, shop_id=shop_id, date=today, delta=100.0, reason='initial')
+        for user_id, shop_id in pairs.values_list('user_id', 'shop_id')
+        if (user_id, shop_id) not in existing
+    ]
+    # ignore_conflicts: a concurrent call may have started the same score
+    ScoreEvent.objects.bulk_create(new_events, batch_size=500, ignore_conflicts=True)
+    return len(new_events)
+
+class ScoreInputs:
+    """
+    Shifts and attendance for a date range, loaded with one query each, so a range of days
+    can be replayed without querying per day.
+    """
+    def __init__(self, start_date, end_date):
+        self.shifts = {} # date -> [(user_id, shop_id, role)] in Shift ordering
+        self.attended = {} # date -> set of user_ids with a TimeLog
+
+        shifts = Shift.objects.filter(date__range=[start_date, end_date], role__in=['main', 'backup']).order_by('date', 'shop', 'id')
+        for d, user_id, shop_id, role in shifts.values_list('date', 'user_id', 'shop_id', 'role'):
+            self.shifts.setdefault(d, []).append((user_id, shop_id, role))
+
+        for d, user_id in TimeLog.objects.filter(date__range=[start_date, end_date]).values_list('date', 'user_id'):
+            self.attended.setdefault(d, set()).add(user_id)
+
+    def for_date(self, target_date):
+        return self.shifts.get(target_date, []), self.attended.get(target_date, set())
+
+def score_input_digest(shifts, attended):
+    """
+    Digest of everything a day's score update depends on: its shifts (in replay order) and attendance.
+    """
+    payload = json.dumps([[list(s) for s in shifts], sorted(attended)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def update_scores_for_date(target_date, inputs=None):
+    """
+    Applies the day's attendance to the scores and re-normalizes every shop to an average of 100.
+    Adjustments are appended as ScoreEvent rows (UserShopScore is only rewritten by compact_scores).
+    Returns the number of events written.
+
+    Every processed day is recorded in ScoreRunLedger with a digest of its inputs. Re-running an
+    unchanged day is a no-op; if the day's shifts or TimeLogs changed since, the day's events are
+    reversed before it is applied again.
+
+    inputs: optional ScoreInputs covering target_date (e.g. preloaded for a backfill range).
+    """
+    if inputs is None:
+        inputs = ScoreInputs(target_date, target_date)
+    shifts, attended = inputs.for_date(target_date)
+    digest = score_input_digest(shifts, attended)
+
+    entry = ScoreRunLedger.objects.filter(date=target_date).first()
+    if entry and entry.input_digest == digest:
+        print(f"Scores for {target_date} already processed, inputs unchanged.")
+        return 0
 
-# Retain existing functions for compatibility
-def update_scores_for_date(target_date):
     print(f"Processing scores for {target_date}...")
-    main_shifts = Shift.objects.filter(date=target_date, role='main')
+    user_ids = {user_id for user_id, shop_id, role in shifts}
+    with transaction.atomic():
+        # Only the shops the day can change (normalization needs all of their scores)
+        shop_ids = _touched_shops(shifts, user_ids, target_date if entry else None)
+        scores, _ = load_current_scores(shop_ids)
+        book = ScoreBook(scores, target_date, user_ids)
+        if entry:
+            book.reverse_date()
+        _apply_score_adjustments(book, shifts, attended)
+        book.normalize()
+        events = book.save()
+
+        if entry is None:
+            entry = ScoreRunLedger(date=target_date)
+        entry.input_digest = digest
+        entry.save()
+    return events
+
+def _touched_shops(shifts, user_ids, reversed_date=None):
+    """
+    Shops whose scores a day's update can change: the day's shift shops, every shop its staff
+    have (or may start) a score at, and the shops of the day's earlier events when it is
+    reversed. A shop's scores depend on that shop's events only, so loading these is exact.
+    """
+    from accounts.models import User
+
+    staff_shops = UserShopScore.objects.filter(user_id__in=user_ids).values_list('shop_id', flat=True).order_by().union(
+        # Scores started since the last compaction, and the shops scores may be started at
+        ScoreEvent.objects.filter(user_id__in=user_ids, reason='initial').values_list('shop_id', flat=True).order_by(),
+        User.applicable_shops.through.objects.filter(user_id__in=user_ids).values_list('shop_id', flat=True),
+    )
+    if reversed_date:
+        staff_shops = staff_shops.union(ScoreEvent.objects.filter(date=reversed_date).values_list('shop_id', flat=True).order_by())
+    return {shop_id for user_id, shop_id, role in shifts} | set(staff_shops)
+
+def _apply_score_adjustments(book, shifts, attended):
+    # Same order as the old per-shift updates, so replaying the events gives the same floating point results
+    main_shifts = [(user_id, shop_id) for user_id, shop_id, role in shifts if role == 'main']
+    backup_shifts = [(user_id, shop_id) for user_id, shop_id, role in shifts if role == 'backup']
+
+    for user_id, shop_id in main_shifts:
+        if user_id not in attended:
+            book.adjust_all_shops(user_id, MISSED_DUTY_ADJUSTMENT, 'missed_duty')
+
+    for user_id, shop_id in backup_shifts:
+        if user_id in attended:
+            book.adjust_all_shops(user_id, STANDBY_WORKED_ADJUSTMENT, 'standby_worked')
+        else:
+            book.adjust_all_shops(user_id, STANDBY_IDLE_ADJUSTMENT, 'standby_idle')
+
+    for user_id, shop_id in main_shifts:
+        if user_id in attended:
+            book.adjust_all_shops(user_id, DUTY_WORKED_ADJUSTMENT, 'duty_worked')
+            book.adjust_shop(user_id, shop_id, DUTY_WORKED_SHOP_ADJUSTMENT, 'duty_worked_shop')
+
+def _replay_events(scores, events):
+    """
+    Applies (user_id, shop_id, delta) events, in id order, to scores. New keys are appended in
+    creation order; an event without a user applies to every score the shop has at that point.
+    """
+    shop_keys = None # shop_id -> [(user_id, shop_id)], built on the first shop-wide event
+    for user_id, shop_id, delta in events:
+        if user_id is None:
+            if shop_keys is None:
+                shop_keys = {}
+                for key in scores:
+                    shop_keys.setdefault(key[1], []).append(key)
+            for key in shop_keys.get(shop_id, []):
+                scores[key] += delta
+            continue
+
+        key = (user_id, shop_id)
+        if key not in scores:
+            scores[key] = 0.0
+            if shop_keys is not None:
+                shop_keys.setdefault(shop_id, []).append(key)
+        scores[key] += delta
 
-    for shift in main_shifts:
-        has_timelog = TimeLog.objects.filter(user=shift.user, date=target_date).exists()
+def load_current_scores(shop_ids=None):
+    """
+    Returns ({(user_id, shop_id): score}, last_event_id): the UserShopScore snapshot with the
+    events after the last compaction replayed on top. Two reads, plus the replay of those events.
+    With shop_ids, only the scores at those shops (last_event_id is then that of their events).
+    """
+    rows = UserShopScore.objects.all()
+    pending = ScoreEvent.objects.all()
+    if shop_ids is not None:
+        rows = rows.filter(shop_id__in=shop_ids)
+        pending = pending.filter(shop_id__in=shop_ids)
+
+    scores = {}
+    for user_id, shop_id, score in rows.order_by('id').values_list('user_id', 'shop_id', 'score'):
+        scores[(user_id, shop_id)] = score
+
+    compacted_through = ScoreCompaction.objects.aggregate(last=Max('last_event_id'))['last'] or 0
+    pending = list(pending.filter(id__gt=compacted_through).order_by('id').values_list('id', 'user_id', 'shop_id', 'delta'))
+    _replay_events(scores, [(user_id, shop_id, delta) for event_id, user_id, shop_id, delta in pending])
+    last_event_id = pending[-1][0] if pending else compacted_through
+    return scores, last_event_id
+
+def compact_scores(as_of_date=None, keep_snapshot=False):
+    """
+    Folds the events since the last compaction into UserShopScore. With keep_snapshot the
+    resulting scores are also copied to ScoreSnapshot, as a starting point for score_as_of.
+    No snapshot is kept when the folded events include days after as_of_date (e.g. a backfill
+    of past days after later days were processed): it would not be the scores as of that day.
+    Returns the ScoreCompaction, or None when there was nothing to fold in.
+    """
+    with transaction.atomic():
+        previous = ScoreCompaction.objects.order_by('-last_event_id').first()
+        scores, last_event_id = load_current_scores()
+        if keep_snapshot and as_of_date and ScoreEvent.objects.filter(id__lte=last_event_id, date__gt=as_of_date).exists():
+            keep_snapshot = False
+        if previous and previous.last_event_id == last_event_id and not keep_snapshot:
+            return None
+
+        now = timezone.now()
+        existing = {(s.user_id, s.shop_id): s for s in UserShopScore.objects.all()}
+        new_rows = []
+        changed_rows = []
+        for (user_id, shop_id), score in scores.items():
+            s = existing.get((user_id, shop_id))
+            if s is None:
+                new_rows.append(UserShopScore(user_id=user_id, shop_id=shop_id, score=score, last_updated=now))
+            elif s.score != score:
+                s.score = score
+                s.last_updated = now
+                changed_rows.append(s)
+        UserShopScore.objects.bulk_create(new_rows, batch_size=500)
+        UserShopScore.objects.bulk_update(changed_rows, ['score', 'last_updated'], batch_size=500)
+
+        compaction = ScoreCompaction.objects.create(last_event_id=last_event_id, as_of_date=as_of_date, row_count=len(scores), has_snapshot=keep_snapshot)
+        if keep_snapshot:
+            ScoreSnapshot.objects.bulk_create([
+                ScoreSnapshot(compaction=compaction, user_id=user_id, shop_id=shop_id, score=score)
+                for (user_id, shop_id), score in scores.items()
+            ], batch_size=500)
+    return compaction
+
+def score_as_of(target_date):
+    """
+    Rebuilds the scores at the end of target_date: the nearest earlier snapshot plus the events
+    after it dated up to target_date. Returns {(user_id, shop_id): score}.
+    """
+    snapshot = ScoreCompaction.objects.filter(
+        Q(as_of_date__lte=target_date) | Q(as_of_date__isnull=True), has_snapshot=True
+    ).order_by('-last_event_id', '-id').first()
+
+    scores = {}
+    after = 0
+    if snapshot:
+        for user_id, shop_id, score in snapshot.snapshots.order_by('id').values_list('user_id', 'shop_id', 'score'):
+            scores[(user_id, shop_id)] = score
+        after = snapshot.last_event_id
 
-        if not has_timelog:
-            _adjust_score_all_shops(shift.user, 20.0)
+    events = ScoreEvent.objects.filter(id__gt=after, date__lte=target_date).order_by('id')
+    _replay_events(scores, events.values_list('user_id', 'shop_id', 'delta'))
+    return scores
 
-    backup_shifts = Shift.objects.filter(date=target_date, role='backup')
 
-    for shift in backup_shifts:
-        has_timelog = TimeLog.objects.filter(user=shift.user, date=target_date).exists()
+class ScoreBook:
+    """
+    In-memory current scores. Adjustments update the scores and queue the matching ScoreEvent
+    rows, which save() appends with one bulk insert.
+    """
+    def __init__(self, scores, target_date, user_ids):
+        from accounts.models import User
+
+        self.scores = scores # (user_id, shop_id) -> score, from load_current_scores()
+        self.date = target_date
+        self.events = []
+
+        self.user_shops = {user_id: [] for user_id in user_ids} # user_id -> [shop_id] with a score
+        self.shop_keys = {} # shop_id -> [(user_id, shop_id)] in creation order
+        for key in scores:
+            user_id, shop_id = key
+            if user_id in self.user_shops:
+                self.user_shops[user_id].append(shop_id)
+            self.shop_keys.setdefault(shop_id, []).append(key)
+
+        # Applicable shops seed the scores of users who have none yet (a fallback: assigning
+        # shops starts their scores through ensure_score_rows)
+        self.applicable_shops = {}
+        through = User.applicable_shops.through
+        for user_id, shop_id in through.objects.filter(user_id__in=self.user_shops.keys()).values_list('user_id', 'shop_id'):
+            self.applicable_shops.setdefault(user_id, []).append(shop_id)
+
+    def _record(self, user_id, shop_id, delta, reason):
+        key = (user_id, shop_id)
+        if key not in self.scores:
+            self.scores[key] = 0.0
+            self.shop_keys.setdefault(shop_id, []).append(key)
+        self.scores[key] += delta
+        self.events.append(ScoreEvent(user_id=user_id, shop_id=shop_id, date=self.date, delta=delta, reason=reason))
+
+    def _record_shop(self, shop_id, delta, reason):
+        # One event for the whole shop instead of one per score
+        for key in self.shop_keys.get(shop_id, []):
+            self.scores[key] += delta
+        self.events.append(ScoreEvent(user_id=None, shop_id=shop_id, date=self.date, delta=delta, reason=reason))
+
+    def _add_row(self, user_id, shop_id, amount, reason):
+        # 0 + 100 + amount, the same float as the 100.0 + amount a new row used to be created with
+        self._record(user_id, shop_id, 100.0, 'initial')
+        self._record(user_id, shop_id, amount, reason)
+        self.user_shops.setdefault(user_id, []).append(shop_id)
+
+    def adjust_shop(self, user_id, shop_id, amount, reason):
+        if (user_id, shop_id) not in self.scores:
+            self._add_row(user_id, shop_id, amount, reason)
+        else:
+            self._record(user_id, shop_id, amount, reason)
 
-        if has_timelog:
-            _adjust_score_all_shops(shift.user, -20.0)
+    def adjust_all_shops(self, user_id, amount, reason):
+        shop_ids = self.user_shops.get(user_id)
+        if not shop_ids:
+            for shop_id in self.applicable_shops.get(user_id, []):
+                self._add_row(user_id, shop_id, amount, reason)
         else:
-            _adjust_score_all_shops(shift.user, 10.0)
-
-    for shift in main_shifts:
-        has_timelog = TimeLog.objects.filter(user=shift.user, date=target_date).exists()
-        if has_timelog:
-                _adjust_score_all_shops(shift.user, -5.0)
-                _adjust_score_shop(shift.user, shift.shop, -2.0)
-
-    shops = set(UserShopScore.objects.values_list('shop', flat=True))
-    for shop_id in shops:
-            scores = UserShopScore.objects.filter(shop_id=shop_id)
-            if scores.exists():
-                avg = sum(s.score for s in scores) / scores.count()
-                delta = 100.0 - avg
-                if abs(delta) > 0.01:
-                    for s in scores:
-                        s.score += delta
-                        s.save()
-
-def _adjust_score_shop(user, shop, amount):
-    s, _ = UserShopScore.objects.get_or_create(user=user, shop=shop)
-    s.score += amount
-    s.save()
-
-def _adjust_score_all_shops(user, amount):
-    scores = UserShopScore.objects.filter(user=user)
-    if not scores.exists():
-        for shop in user.applicable_shops.all():
-            UserShopScore.objects.create(user=user, shop=shop, score=100.0 + amount)
-    else:
-        for s in scores:
-            s.score += amount
-            s.save()
+            for shop_id in shop_ids:
+                self._record(user_id, shop_id, amount, reason)
+
+    def reverse_date(self):
+        """
+        Cancels every earlier event of the day (apart from the initial scores) with one reversal event per score.
+        """
+        day_events = list(ScoreEvent.objects.filter(date=self.date).exclude(reason='initial').order_by('id').values_list('id', 'user_id', 'shop_id', 'delta'))
+
+        # A shop-wide event only reached the scores created before it
+        created = {}
+        shop_ids = {shop_id for event_id, user_id, shop_id, delta in day_events if user_id is None}
+        if shop_ids:
+            initial = ScoreEvent.objects.filter(reason='initial', shop_id__in=shop_ids)
+            for event_id, user_id, shop_id in initial.values_list('id', 'user_id', 'shop_id'):
+                created[(user_id, shop_id)] = event_id
+
+        net = {}
+        for event_id, user_id, shop_id, delta in day_events:
+            if user_id is None:
+                keys = [key for key in self.shop_keys.get(shop_id, []) if created.get(key, 0) < event_id]
+            else:
+                keys = [(user_id, shop_id)]
+            for key in keys:
+                net[key] = net.get(key, 0.0) + delta
+
+        for (user_id, shop_id), delta in net.items():
+            if delta:
+                self._record(user_id, shop_id, -delta, 'reversal')
+
+    def normalize(self):
+        """
+        Shifts every shop's scores so the shop average is 100, with one event per shop.
+        """
+        for shop_id, keys in self.shop_keys.items():
+            if not keys:
+                continue
+            avg = sum(self.scores[key] for key in keys) / len(keys)
+            delta = 100.0 - avg
+            if abs(delta) > 0.01:
+                self._record_shop(shop_id, delta, 'normalization')
+
+    def save(self):
+        ScoreEvent.objects.bulk_create(self.events, batch_size=500)
+        count = len(self.events)
+        self.events = []
+        return count
@@ -0,0 +1,84 @@
+"""
+Database-backed version counters for the cached read models (scheduling.grid, scheduling.ical).
+
+Cached entries are per process (LocMemCache) but their keys include a version read from
+CacheVersion, so a bump made anywhere invalidates them in every worker. A counter starts
+from the clock so one lost to a rolled-back transaction never matches older entries.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .models import CacheVersion
+
+_local = threading.local()
+
+
+def get_version(key, max_age=0):
+    """
+    The current version of the key. With a max_age (seconds) it is kept in this process's
+    cache for that long, so bumps made by other processes show up only after it expires.
+    """
+    if max_age:
+        version = cache.get(f'version:{key}')
+        if version is not None:
+            return version
+    version = CacheVersion.objects.filter(key=key).values_list('version', flat=True).first()
+    if version is None:
+        version = CacheVersion.objects.get_or_create(key=key, defaults={'version': time.time_ns()})[0].version
+    if max_age:
+        cache.set(f'version:{key}', version, max_age)
+    return version
+
+
+def bump_version(key):
+    if not CacheVersion.objects.filter(key=key).update(version=F('version') + 1):
+        CacheVersion.objects.get_or_create(key=key, defaults={'version': time.time_ns()})
+    cache.delete(f'version:{key}')
+
+
+class _CommitBump:
+    """
+    An on_commit callback bumping one key, which remembers whether it has run.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        bump_version(self.key)
+
+
+def bump_version_on_commit(key):
+    """
+    Bumps the key once when the current transaction commits, however many rows of it ask
+    for that (at once outside a transaction). Does nothing inside bumps_suppressed().
+    """
+    if getattr(_local, 'suppressed', False):
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        bump_version(key)
+        return
+    # Callbacks of rolled back savepoints are dropped from this list, so they are registered again
+    for _, func, _ in connection.run_on_commit:
+        if isinstance(func, _CommitBump) and func.key == key and not func.done:
+            return
+    transaction.on_commit(_CommitBump(key))
+
+
+@contextmanager
+def bumps_suppressed():
+    """
+    Turns bump_version_on_commit off in this thread, for bulk writes whose caller bumps the
+    affected versions itself.
+    """
+    previous = getattr(_local, 'suppressed', False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = previous
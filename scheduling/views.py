@@ -1,19 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponseForbidden
-from .models import Preference, Schedule, Shift, UserShopScore, ShopRequirement, ScheduleChangeLog, UserPriority
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, Http404
+from django.urls import reverse
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.middleware.csrf import get_token
+from .models import Preference, Schedule, Shift, UserShopScore, ShopRequirement, ScheduleChangeLog, UserPriority, GenerationRun, ScoreRunLedger, ScoreBackfill, ScoreEvent, ScoreCompaction, CalendarFeed
 from attendance.models import Shop, ShopOperatingHours, TimeLog
 from accounts.models import AccountActionLog, PasswordResetRequest
 from django.db.models import Count, Q
 from django.utils import timezone
 from .forms import PreferenceForm, ShiftAddForm
-from .utils import ensure_roving_shop_and_assignments, update_scores_for_date, calculate_assignment_score, CurrentWeekAssignments
+from .utils import ensure_roving_shop_and_assignments, update_scores_for_date, compact_scores, calculate_assignment_score, CurrentWeekAssignments
+from .scoring import HistoryIndex, compile_scoring_rules
+from .profiling import GenerationProfiler
+from .ical import bump_feed_version, rotate_feed_token, feed_user_id, feed_etag, get_feed
+from .versions import bumps_suppressed
+from .grid import grid_cache_stats, get_schedule_grid, get_grid_version, bump_grid_version, grid_fragment_key, shop_columns, date_rows, shop_rows, compact_grid, get_week_stats, shift_counts, staff_totals, FRAGMENT_CACHE_TIMEOUT
 import datetime
+import hashlib
 import math
+import os
 import random
 from accounts.models import User
 
+# Browser lifetime of a published week that is over; later edits show once it expires
+PAST_WEEK_MAX_AGE = 60 * 60 * 24
+HISTORY_PAGE_SIZE = 12
+
 @login_required
 def preferences(request):
     try:
@@ -34,9 +52,98 @@ def preferences(request):
     else:
         form = PreferenceForm(instance=pref)
 
-    return render(request, 'scheduling/preferences.html', {'form': form})
+    feed = CalendarFeed.objects.filter(user=request.user).first()
+    calendar_url = request.build_absolute_uri(reverse('scheduling:calendar_feed', args=[feed.token])) if feed else None
+    return render(request, 'scheduling/preferences.html', {'form': form, 'calendar_url': calendar_url})
 
 @login_required
+def calendar_feed_rotate(request):
+    if request.method == 'POST':
+        rotate_feed_token(request.user)
+        messages.success(request, "New calendar link created. Links shared before no longer work.")
+    return redirect('scheduling:preferences')
+
+def _calendar_feed_etag(request, token):
+    user_id = feed_user_id(token)
+    return feed_etag(user_id) if user_id is not None else None
+
+@condition(etag_func=_calendar_feed_etag)
+def calendar_feed(request, token):
+    """
+    iCalendar feed of the token owner's published shifts. No login: the token is the secret.
+    """
+    user_id = feed_user_id(token)
+    if user_id is None:
+        raise Http404
+    response = HttpResponse(get_feed(user_id), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="shifts.ics"'
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _visible_shops(user, shops_qs):
+    """
+    The shops of shops_qs the user may see (all for administrators, else their Area's),
+    Roving first, and the name of that scope for cache keys.
+    """
+    scope = 'all'
+    if user.tier != 'administrator' and not user.is_superuser:
+        if user.area_id:
+            shops_qs = shops_qs.filter(area_id=user.area_id)
+            scope = f'area-{user.area_id}'
+        else:
+            # Unassigned users see nothing
+            shops_qs = shops_qs.none()
+            scope = 'none'
+
+    # Sort: Roving first
+    roving_shops = list(shops_qs.filter(name='Roving'))
+    other_shops = list(shops_qs.exclude(name='Roving'))
+    return roving_shops + other_shops, scope
+
+
+def _page_etag(request, *parts):
+    """
+    ETag of a schedule page for this viewer: the given parts plus what the page chrome
+    depends on (user, tier, CSRF secret). None when messages are pending, so they get shown.
+    """
+    if list(messages.get_messages(request)):
+        return None
+    get_token(request) # Makes sure the page and its ETag agree on the CSRF secret
+    user = request.user
+    viewer = (user.pk, user.username, user.tier, user.is_superuser, user.area_id, request.META['CSRF_COOKIE'])
+    return hashlib.md5(repr((viewer,) + parts).encode()).hexdigest()
+
+
+def _shops_signature(shops):
+    return [(s.id, s.name) for s in shops]
+
+
+def _my_schedule_etag(request):
+    today = timezone.localdate()
+    start_of_current_week = today - datetime.timedelta(days=today.weekday())
+    week_starts = [start_of_current_week, start_of_current_week + datetime.timedelta(days=7)]
+
+    shops, _ = _visible_shops(request.user, Shop.objects.filter(is_active=True))
+    published = dict(Schedule.objects.filter(week_start_date__in=week_starts, is_published=True).values_list('week_start_date', 'id'))
+    weeks = [(published.get(w), get_grid_version(w)) for w in week_starts]
+    return _page_etag(request, today, _shops_signature(shops), weeks)
+
+
+def _history_detail_etag(request, schedule_id):
+    schedule = Schedule.objects.filter(id=schedule_id, is_published=True).only('id', 'week_start_date').first()
+    if schedule is None:
+        return None
+    today = timezone.localdate()
+    if request.user.tier == 'regular' and schedule.week_start_date < today - datetime.timedelta(days=today.weekday(), weeks=2):
+        return None # Out of reach now; let the view refuse it
+    shops, _ = _visible_shops(request.user, Shop.objects.all())
+    # today only matters while the week is not over (absences and ongoing shifts)
+    is_past = schedule.week_start_date + datetime.timedelta(days=6) < today
+    return _page_etag(request, schedule.id, is_past or today, _shops_signature(shops), get_grid_version(schedule.week_start_date))
+
+
+@login_required
+@condition(etag_func=_my_schedule_etag)
 def my_schedule(request):
     today = timezone.localdate()
     # Week starts Monday (0)
@@ -47,198 +154,26 @@ def my_schedule(request):
     # "Schedules and current status of time-ins/outs are also now separated per Area. Administrators can see all areas, Supervisors can only see theirs."
     # Regulars also only see theirs (confirmed in planning).
 
-    shops_qs = Shop.objects.filter(is_active=True)
-
-    user_area = None
-    if request.user.tier != 'administrator' and not request.user.is_superuser:
-        if request.user.area:
-            user_area = request.user.area
-            shops_qs = shops_qs.filter(area=user_area)
-        else:
-            # Unassigned users see nothing? Or maybe they see nothing.
-            shops_qs = shops_qs.none()
-
-    # Sort: Roving first
-    roving_shops = list(shops_qs.filter(name='Roving'))
-    other_shops = list(shops_qs.exclude(name='Roving'))
-    shops = roving_shops + other_shops
+    shops, _ = _visible_shops(request.user, Shop.objects.filter(is_active=True))
 
     schedules_data = []
+    columns = shop_columns(shops)
+
+    # Future days are editable by supervisors and administrators
+    can_edit = request.user.is_superuser or request.user.tier in ['supervisor', 'administrator']
+    editable_after = today if can_edit else None
 
     def build_schedule_data(schedule_obj):
         if not schedule_obj:
             return None
-        dates = [schedule_obj.week_start_date + datetime.timedelta(days=i) for i in range(7)]
-        matrix = {}
-        for d in dates:
-            matrix[d] = {}
-            for s in shops:
-                matrix[d][s.id] = {'main': [], 'backup': []}
-
-        shifts = schedule_obj.shifts.all().select_related('user', 'shop')
-
-        # Filter shifts by shop (which is already filtered by Area)
-        # However, for Administrators seeing "All Areas", we want to display them organized.
-        # But 'shops' list handles the columns.
-        # If Admin, 'shops' contains ALL shops.
-
-        # NOTE: Roving Visibility Logic
-        # "If Global: Does a Supervisor in "Area A" see "Roving" in their list? If so, do they see all staff in Roving, or only staff from "Area A" who are currently in Roving?"
-        # Answer: Roving is now per Area. So Supervisor A sees Roving A.
-        # So standard shop filtering works.
-
-        # Fetch TimeLogs for the week
-        week_end_date = dates[-1]
-        logs = TimeLog.objects.filter(date__range=[dates[0], week_end_date]).select_related('user', 'shop')
-        logs_map = {} # (date, shop_id) -> list of users who logged in
-        logs_objects_map = {} # (date, shop_id) -> list of TimeLog objects
-
-        for log in logs:
-            if not log.shop: continue
-            key = (log.date, log.shop.id)
-            if key not in logs_map:
-                logs_map[key] = []
-                logs_objects_map[key] = []
-            logs_map[key].append(log.user)
-            logs_objects_map[key].append(log)
-
-        for shift in shifts:
-            if shift.date in matrix and shift.shop.id in matrix[shift.date]:
-                # Determine actual attendance status
-                status_dict = {'assigned': shift.user, 'actual': None, 'status': 'absent'}
-
-                key = (shift.date, shift.shop.id)
-                logged_users = logs_map.get(key, [])
-
-                # Check if assigned user is present
-                found = False
-                for u in logged_users:
-                    if u.id == shift.user.id:
-                        found = True
-                        break
-
-                if found:
-                    status_dict['actual'] = shift.user
-                    status_dict['status'] = 'reported'
-                else:
-                     # Absent Logic: "Only appears if date has passed"
-                     if shift.date < today:
-                          status_dict['status'] = 'absent'
-                     else:
-                          status_dict['status'] = '' # Future/Today absent is just blank
-
-                if shift.role == 'main':
-                    matrix[shift.date][shift.shop.id]['main'].append(shift)
-                else:
-                    matrix[shift.date][shift.shop.id]['backup'].append(shift)
-
-        # Re-process matrix to attach 'actual' info
-        for d in dates:
-            for s in shops:
-                # Main
-                shifts_list = matrix[d][s.id]['main']
-                key = (d, s.id)
-                logged_users = logs_map.get(key, [])[:] # copy
-
-                # 1. Mark Present
-                matched_logs = []
-                for shift in shifts_list:
-                    match = None
-                    for u in logged_users:
-                        if u.id == shift.user.id:
-                            match = u
-                            break
-
-                    if match:
-                        shift.actual_user = shift.user
-
-                        # Find the actual log object to check times
-                        log_obj = None
-                        for l in logs_objects_map.get(key, []):
-                            if l.user_id == shift.user.id:
-                                log_obj = l
-                                break
-
-                        if log_obj:
-                             if log_obj.time_in and log_obj.time_out:
-                                 shift.status = 'reported'
-                             elif log_obj.time_in and not log_obj.time_out:
-                                 if d == today:
-                                     shift.status = 'ongoing' # Display "Ongoing"
-                                 elif d < today:
-                                     shift.status = 'incomplete' # Display "Incomplete Log"
-                                 else:
-                                     shift.status = 'reported' # Should not happen for future
-                             else:
-                                 shift.status = 'reported' # Fallback
-                        else:
-                             shift.status = 'reported'
-
-                        matched_logs.append(match)
-                    else:
-                        shift.actual_user = None
-                        if d < today:
-                            shift.status = 'absent'
-                        else:
-                            shift.status = ''
-
-                # Remove matched from available logs
-                for m in matched_logs:
-                    if m in logged_users:
-                        logged_users.remove(m)
-
-                # Second pass: Assign remaining logs to 'absent' shifts (Substitutes)
-                for shift in shifts_list:
-                    if shift.status == 'absent':
-                        if logged_users:
-                            # Take first available
-                            sub = logged_users.pop(0)
-                            shift.actual_user = sub
-                            shift.status = 'substituted'
-                        else:
-                            # Truly absent
-                            pass
-
-                # 3. Handle Supplement (Remaining logged users who weren't assigned or used as subs)
-                # Create a pseudo-shift object for display
-                for extra_user in logged_users:
-                    # Determine status for extra user (Ongoing vs Present vs Incomplete)
-                    # We need the log object
-                    extra_status = 'supplement' # Default base
-                    log_obj = None
-                    for l in logs_objects_map.get(key, []):
-                        if l.user_id == extra_user.id:
-                            log_obj = l
-                            break
-
-                    # Refine status based on time_out presence?
-                    # Prompt says: "show his name card and add 'Supplement'"
-                    # But also: "latest status of whether reported, absent, incomplete, supplement, etc."
-                    # If I use 'supplement', the template will show "SUPPLEMENT".
-                    # If I want to show "Incomplete" + "Supplement", it gets complex.
-                    # Let's stick to "Supplement" as the primary status indicator for these unassigned folks.
-                    # Or we can check if ongoing.
-
-                    # Create a Simple Namespace or dict-like object
-                    class PseudoShift:
-                        def __init__(self, user, status):
-                            self.user = user
-                            self.status = status
-                            self.actual_user = user
-                            self.role = 'supplement'
-
-                    matrix[d][s.id]['main'].append(PseudoShift(extra_user, 'supplement'))
-
-                # Handle Backup similarly
-                # Just listing
-                pass
-
+        # Shared by every viewer of the same shops; cached until the week changes
+        grid = get_schedule_grid(schedule_obj, shops, today)
         return {
             'schedule': schedule_obj,
-            'dates': dates,
-            'matrix': matrix,
+            'dates': grid['dates'],
+            'matrix': grid['matrix'],
+            'rows': date_rows(grid['dates'], columns, grid['matrix'], editable_after),
             'change_logs': schedule_obj.change_logs.all().order_by('-created_at'),
-            'logs_map': logs_map
         }
 
     # Current Week
@@ -253,20 +188,23 @@ def my_schedule(request):
     if data_next:
         schedules_data.append(data_next)
 
-    all_users = User.objects.filter(is_active=True, is_approved=True)
-    return render(request, 'scheduling/my_schedule.html', {
+    response = render(request, 'scheduling/my_schedule.html', {
         'schedules_data': schedules_data,
         'shops': shops,
+        'columns': columns,
+        'can_edit': can_edit,
         'today': today,
-        'all_users': all_users,
     })
+    # Always revalidate; unchanged weeks answer with a 304 from the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 def schedule_history_list(request):
     today = timezone.localdate()
     start_of_current_week = today - datetime.timedelta(days=today.weekday())
 
-    schedules = Schedule.objects.filter(is_published=True).order_by('-week_start_date')
+    schedules = Schedule.objects.filter(is_published=True)
 
     if request.user.tier == 'regular':
         # Limit to past 2 weeks relative to current week
@@ -274,9 +212,37 @@ def schedule_history_list(request):
         min_date = start_of_current_week - datetime.timedelta(weeks=2)
         schedules = schedules.filter(week_start_date__gte=min_date)
 
-    return render(request, 'scheduling/schedule_history_list.html', {'schedules': schedules})
+    # Keyset pagination on week_start_date: ?before=<date> pages back, ?after=<date> forward
+    try:
+        before = _parse_date_param(request.GET.get('before'))
+        after = _parse_date_param(request.GET.get('after'))
+    except ValueError:
+        before = after = None
+    if after:
+        page = list(schedules.filter(week_start_date__gt=after).order_by('week_start_date')[:HISTORY_PAGE_SIZE + 1])
+        has_newer = len(page) > HISTORY_PAGE_SIZE
+        page = page[:HISTORY_PAGE_SIZE][::-1]
+        has_older = schedules.filter(week_start_date__lte=after).exists()
+    else:
+        older = schedules.filter(week_start_date__lt=before) if before else schedules
+        page = list(older.order_by('-week_start_date')[:HISTORY_PAGE_SIZE + 1])
+        has_older = len(page) > HISTORY_PAGE_SIZE
+        page = page[:HISTORY_PAGE_SIZE]
+        has_newer = before is not None and schedules.filter(week_start_date__gte=before).exists()
+
+    # Stats over the shops the user may see, from the cached grids
+    shops, _ = _visible_shops(request.user, Shop.objects.all())
+    for schedule in page:
+        schedule.stats = get_week_stats(schedule, shops, today)
+
+    return render(request, 'scheduling/schedule_history_list.html', {
+        'schedules': page,
+        'newer_after': page[0].week_start_date if page and has_newer else None,
+        'older_before': page[-1].week_start_date if page and has_older else None,
+    })
 
 @login_required
+@condition(etag_func=_history_detail_etag)
 def schedule_history_detail(request, schedule_id):
     schedule = get_object_or_404(Schedule, id=schedule_id, is_published=True)
 
@@ -287,70 +253,178 @@ def schedule_history_detail(request, schedule_id):
         if schedule.week_start_date < min_date:
              return HttpResponseForbidden("You are not authorized to view schedules older than 2 weeks.")
 
+    # Filter Shops by Area
+    shops, scope = _visible_shops(request.user, Shop.objects.all())
+
+    today = timezone.localdate()
     dates = [schedule.week_start_date + datetime.timedelta(days=i) for i in range(7)]
 
-    # Filter Shops by Area
-    shops_qs = Shop.objects.all()
-    if request.user.tier != 'administrator' and not request.user.is_superuser:
-        if request.user.area:
-            shops_qs = shops_qs.filter(area=request.user.area)
-        else:
-            shops_qs = shops_qs.none()
+    # A published week that is over renders the same until someone edits it: keep its HTML
+    fragment_key = grid_fragment_key(schedule, shops, scope) if dates[-1] < today else None
+    grid_html = cache.get(fragment_key) if fragment_key else None
+    if grid_html is None:
+        # Same reconciliation (and cache) as my_schedule
+        grid = get_schedule_grid(schedule, shops, today)
+        grid_html = render_to_string('scheduling/schedule_history_grid.html', {
+            'dates': dates,
+            'rows': shop_rows(dates, shop_columns(shops), grid['matrix']),
+        }, request=request)
+        if fragment_key:
+            cache.set(fragment_key, grid_html, FRAGMENT_CACHE_TIMEOUT)
+
+    response = render(request, 'scheduling/schedule_history_detail.html', {
+        'schedule': schedule,
+        'dates': dates,
+        'shops': shops,
+        'grid_html': mark_safe(grid_html),
+        'change_logs': schedule.change_logs.all().order_by('-created_at')
+    })
+    if fragment_key:
+        # Over and published: let the browser keep it instead of revalidating every view
+        patch_cache_control(response, private=True, max_age=PAST_WEEK_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _api_schedule_and_shops(request, schedule_id, area_id):
+    """
+    The published schedule and the area's shops (Roving first) when the user may read them:
+    administrators any area, others their own; regular staff back to two weeks ago.
+    """
+    user = request.user
+    if user.tier != 'administrator' and not user.is_superuser and user.area_id != area_id:
+        return None, None
+    schedule = Schedule.objects.filter(id=schedule_id, is_published=True).first()
+    if schedule is None:
+        return None, None
+    if user.tier == 'regular':
+        today = timezone.localdate()
+        if schedule.week_start_date < today - datetime.timedelta(days=today.weekday(), weeks=2):
+            return None, None
+    shops_qs = Shop.objects.filter(area_id=area_id)
+    return schedule, list(shops_qs.filter(name='Roving')) + list(shops_qs.exclude(name='Roving'))
+
+
+def _schedule_json_etag(request, schedule_id, area_id):
+    schedule, shops = _api_schedule_and_shops(request, schedule_id, area_id)
+    if schedule is None:
+        return None
+    today = timezone.localdate()
+    is_past = schedule.week_start_date + datetime.timedelta(days=6) < today
+    # Same data for every reader of the area, so not per viewer
+    parts = (schedule.id, area_id, _shops_signature(shops), get_grid_version(schedule.week_start_date),
+             is_past or today, request.GET.urlencode())
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _parse_date_param(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+@login_required
+@condition(etag_func=_schedule_json_etag)
+def schedule_json(request, schedule_id, area_id):
+    """
+    Read-only grid of one schedule and area in the columnar form of grid.compact_grid.
+    Optional filters: ?user=<id>, ?from=YYYY-MM-DD, ?to=YYYY-MM-DD.
+    """
+    schedule, shops = _api_schedule_and_shops(request, schedule_id, area_id)
+    if schedule is None:
+        return JsonResponse({'error': 'Schedule not found.'}, status=404)
+    try:
+        user_id = int(request.GET['user']) if request.GET.get('user') else None
+        date_from = _parse_date_param(request.GET.get('from'))
+        date_to = _parse_date_param(request.GET.get('to'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid filter: user is an id, from/to are YYYY-MM-DD.'}, status=400)
+
+    today = timezone.localdate()
+    grid = get_schedule_grid(schedule, shops, today)
+    data = compact_grid(grid['dates'], shops, grid['matrix'], user_id=user_id, date_from=date_from, date_to=date_to)
+    data['schedule'] = {'id': schedule.id, 'week_start_date': schedule.week_start_date.isoformat(), 'area': area_id}
+
+    response = JsonResponse(data)
+    if grid['dates'][-1] < today:
+        patch_cache_control(response, private=True, max_age=PAST_WEEK_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
 
+def _generator_area(request):
+    """
+    The Area the generator works on: a supervisor's own, or the one an administrator
+    selected with ?area_id= (None until they pick one).
+    """
+    from accounts.models import Area
+    if request.user.tier == 'supervisor' and not request.user.is_superuser:
+        return request.user.area
+    # Administrator/Superuser
+    # "Select a specific Area to generate the schedule for": wait for a selection
+    area_id = request.GET.get('area_id')
+    if area_id:
+        return get_object_or_404(Area, id=area_id)
+    return None
+
+
+def _generator_shops(target_area):
+    # Generation is per-area: no Area selected, no shops
+    if not target_area:
+        return []
+    shops_qs = Shop.objects.filter(is_active=True, area=target_area)
     roving_shops = list(shops_qs.filter(name='Roving'))
     other_shops = list(shops_qs.exclude(name='Roving'))
-    shops = roving_shops + other_shops
+    return roving_shops + other_shops
+
 
+def _generator_week_data(request, schedule, shops, columns, counts):
+    """
+    The rows of one generator week, with everything the template shows per shift and cell.
+    counts: shift_counts() covering the week.
+    """
+    dates = [schedule.week_start_date + datetime.timedelta(days=i) for i in range(7)]
     matrix = {}
     for d in dates:
         matrix[d] = {}
         for s in shops:
             matrix[d][s.id] = {'main': [], 'backup': []}
 
-    shifts = schedule.shifts.all().select_related('user', 'shop')
-
-    # Fetch logs to determine status (Absent/Substituted)
-    week_end = dates[-1]
-    logs = TimeLog.objects.filter(date__range=[dates[0], week_end]).select_related('user', 'shop')
-    logs_map = {}
-    for log in logs:
-        if log.shop:
-            key = (log.date, log.shop.id)
-            if key not in logs_map:
-                logs_map[key] = []
-            logs_map[key].append(log.user)
+    # An unsaved week (not generated yet) has no shifts
+    shifts = schedule.shifts.all().select_related('user') if schedule.pk else []
 
     for shift in shifts:
-        if shift.date in matrix and shift.shop.id in matrix[shift.date]:
-             # Determine Status (Simplified for History)
-             # Check if present in logs
-             key = (shift.date, shift.shop.id)
-             shop_logs = logs_map.get(key, [])
-
-             is_present = any(u.id == shift.user.id for u in shop_logs)
-
-             if is_present:
-                 shift.status = 'reported'
-                 shift.actual_user = shift.user
-             else:
-                 if shift.date < timezone.localdate():
-                     shift.status = 'absent'
-                 else:
-                     shift.status = ''
-                 shift.actual_user = None
-
-             if shift.role == 'main':
-                 matrix[shift.date][shift.shop.id]['main'].append(shift)
-             else:
-                 matrix[shift.date][shift.shop.id]['backup'].append(shift)
-
-    return render(request, 'scheduling/schedule_history_detail.html', {
+        if shift.date in matrix and shift.shop_id in matrix[shift.date]:
+            if shift.role == 'main':
+                matrix[shift.date][shift.shop_id]['main'].append(shift)
+            else:
+                matrix[shift.date][shift.shop_id]['backup'].append(shift)
+
+    # Everything the template shows per shift and cell, computed once here
+    delete_url = reverse('scheduling:shift_delete', args=[0]).replace('/0/', '/{}/')
+    can_delete = not schedule.is_published or request.user.is_superuser
+    can_add = not schedule.is_published and schedule.pk is not None
+    rows = date_rows(dates, columns, matrix)
+    for row in rows:
+        iso = row.date.isoformat()
+        for cell in row.cells:
+            for shift in cell.main:
+                shift.duty_count = counts.get((schedule.id, shift.user_id), (0, 0))[0]
+                shift.score_label = f"{shift.score:.1f}" if shift.score is not None else ''
+            for shift in cell.main + cell.backup:
+                shift.delete_url = delete_url.format(shift.id)
+            if can_add:
+                cell.add_main_url = reverse('scheduling:shift_add', args=[schedule.id, iso, cell.shop.id, 'main'])
+                if cell.is_roving:
+                    cell.add_backup_url = reverse('scheduling:shift_add', args=[schedule.id, iso, cell.shop.id, 'backup'])
+
+    return {
         'schedule': schedule,
         'dates': dates,
-        'shops': shops,
         'matrix': matrix,
-        'change_logs': schedule.change_logs.all().order_by('-created_at')
-    })
+        'rows': rows,
+        'can_delete': can_delete,
+        'can_add': can_add,
+    }
+
 
 @login_required
 def generator(request):
@@ -358,27 +432,12 @@ def generator(request):
     if request.user.tier not in ['supervisor', 'administrator'] and not request.user.is_superuser:
         return HttpResponseForbidden()
 
-    ensure_roving_shop_and_assignments()
-
     # Determine Target Area
-    target_area = None
     areas = Area.objects.all()
-
-    if request.user.tier == 'supervisor' and not request.user.is_superuser:
-        target_area = request.user.area
-        if not target_area:
-             messages.error(request, "You are not assigned to an Area.")
-             return redirect('attendance:home')
-    else:
-        # Administrator/Superuser
-        area_id = request.GET.get('area_id')
-        if area_id:
-            target_area = get_object_or_404(Area, id=area_id)
-        else:
-            # If no Area selected, show selector (or default to first?)
-            # The prompt says: "Select a specific Area to generate the schedule for"
-            # We can let them select via a dropdown in GET param
-            pass
+    target_area = _generator_area(request)
+    if request.user.tier == 'supervisor' and not request.user.is_superuser and not target_area:
+        messages.error(request, "You are not assigned to an Area.")
+        return redirect('attendance:home')
 
     today = timezone.localdate()
     days_until_monday = (0 - today.weekday()) % 7
@@ -387,38 +446,25 @@ def generator(request):
 
     next_week_start = today + datetime.timedelta(days=days_until_monday)
 
-    # Handle 4 weeks
-    weeks = []
-    for i in range(4):
-        start_date = next_week_start + datetime.timedelta(days=i*7)
-        sch, _ = Schedule.objects.get_or_create(week_start_date=start_date)
-        weeks.append(sch)
+    # Handle 4 weeks. Page views only read: weeks without a Schedule yet are shown empty
+    # (unsaved) and created when something is generated.
+    week_starts = [next_week_start + datetime.timedelta(days=i*7) for i in range(4)]
+    existing = {sch.week_start_date: sch for sch in Schedule.objects.filter(week_start_date__in=week_starts)}
+    weeks = [existing.get(start_date) or Schedule(week_start_date=start_date) for start_date in week_starts]
 
     current_schedule = weeks[0]
 
-    # Filter Shops
-    shops_qs = Shop.objects.filter(is_active=True)
-
-    if target_area:
-        shops_qs = shops_qs.filter(area=target_area)
-    elif request.user.is_superuser or request.user.tier == 'administrator':
-        # If Admin hasn't selected an area, maybe show nothing or all?
-        # Prompt: "Select a specific Area to generate the schedule for"
-        # It implies generation is per-area.
-        # If no area selected, we probably shouldn't show the matrix or allow generate?
-        # But for UI consistency, let's wait for selection.
-        if not area_id:
-             shops_qs = shops_qs.none()
-
-    roving_shops = list(shops_qs.filter(name='Roving'))
-    other_shops = list(shops_qs.exclude(name='Roving'))
-    shops = roving_shops + other_shops
+    shops = _generator_shops(target_area)
 
     if request.method == 'POST':
         if 'generate' in request.POST:
             if not target_area and (request.user.is_superuser or request.user.tier == 'administrator'):
                  messages.error(request, "Please select an Area to generate schedule.")
             else:
+                # Roving shops and default shop assignments are settled before generating
+                ensure_roving_shop_and_assignments()
+                shops = _generator_shops(target_area)
+                weeks = [Schedule.objects.get_or_create(week_start_date=sch.week_start_date)[0] for sch in weeks]
                 _generate_multi_week_schedule(shops, weeks, target_area)
                 messages.success(request, f"Schedule generated for 4 weeks for {target_area}.")
 
@@ -429,61 +475,90 @@ def generator(request):
             return redirect(redirect_url)
 
         elif 'publish' in request.POST:
+            if current_schedule.pk is None:
+                messages.error(request, "Generate the schedule before publishing it.")
+                return redirect('scheduling:generator')
             current_schedule.is_published = True
             current_schedule.save()
             messages.success(request, "Schedule published (Week 1 only).")
             return redirect('scheduling:generator')
         elif 'clear' in request.POST:
             for sch in weeks:
-                sch.shifts.all().delete()
-                sch.change_logs.all().delete()
-                sch.is_published = False
-                sch.save()
+                if sch.pk is None:
+                    continue
+                with bumps_suppressed():
+                    sch.shifts.all().delete()
+                    sch.change_logs.all().delete()
+                    sch.is_published = False
+                    sch.save()
+                bump_grid_version(sch.week_start_date)
+            bump_feed_version()
             messages.success(request, "Generated schedule window cleared.")
             return redirect('scheduling:generator')
 
-    # Prepare data for Template
-    weeks_data = []
-    for schedule in weeks:
-        dates = [schedule.week_start_date + datetime.timedelta(days=i) for i in range(7)]
-        matrix = {}
-        for d in dates:
-            matrix[d] = {}
-            for s in shops:
-                matrix[d][s.id] = {'main': [], 'backup': []}
-
-        shifts = schedule.shifts.all().select_related('user', 'shop')
-        duty_counts = {} # user_id -> count
-
-        for shift in shifts:
-            if shift.date in matrix and shift.shop.id in matrix[shift.date]:
-                if shift.role == 'main':
-                    matrix[shift.date][shift.shop.id]['main'].append(shift)
-                    duty_counts[shift.user.id] = duty_counts.get(shift.user.id, 0) + 1
-                else:
-                    matrix[shift.date][shift.shop.id]['backup'].append(shift)
-
+    # Prepare data for Template: week 1 now, the other tabs fetch their week when opened
+    columns = shop_columns(shops)
+    # Duty/standby counts of all 4 weeks in one query: the badges of week 1 and the totals table
+    counts = shift_counts(weeks, shops)
+    weeks_data = [_generator_week_data(request, weeks[0], shops, columns, counts)]
+    area_query = f"?area_id={target_area.id}" if target_area else ''
+    for schedule in weeks[1:]:
+        if schedule.pk is None:
+            # Nothing to fetch
+            weeks_data.append(_generator_week_data(request, schedule, shops, columns, counts))
+            continue
         weeks_data.append({
             'schedule': schedule,
-            'dates': dates,
-            'matrix': matrix,
-            'duty_counts': duty_counts
+            'lazy_url': reverse('scheduling:generator_week', args=[schedule.id]) + area_query,
         })
 
-    from django.urls import reverse # Import needed
+    # Timings of the last run for this Area, so slow generations are visible
+    last_generation_run = None
+    if target_area:
+        last_generation_run = GenerationRun.objects.filter(area=target_area).first()
+
     return render(request, 'scheduling/generator.html', {
         'weeks_data': weeks_data,
+        'staff_totals': staff_totals(weeks, counts),
         'current_schedule': current_schedule,
         'shops': shops,
-        'change_logs': current_schedule.change_logs.all().order_by('-created_at'),
+        'columns': columns,
+        'change_logs': current_schedule.change_logs.all().order_by('-created_at') if current_schedule.pk else [],
         'areas': areas,
         'selected_area': target_area,
+        'last_generation_run': last_generation_run,
+    })
+
+@login_required
+def generator_week(request, schedule_id):
+    """
+    One week of the generator as an HTML fragment, loaded when its tab is opened.
+    """
+    if request.user.tier not in ['supervisor', 'administrator'] and not request.user.is_superuser:
+        return HttpResponseForbidden()
+    schedule = get_object_or_404(Schedule, id=schedule_id)
+    shops = _generator_shops(_generator_area(request))
+    columns = shop_columns(shops)
+    return render(request, 'scheduling/generator_week.html', {
+        'week': _generator_week_data(request, schedule, shops, columns, shift_counts([schedule], shops)),
+        'columns': columns,
     })
 
-def _generate_multi_week_schedule(shops, weeks, area):
+def _generate_multi_week_schedule(shops, weeks, area, mode='manual'):
+    """
+    Generates Duty and Standby shifts for 'shops' of 'area' over 'weeks' and stores
+    a GenerationRun with the per-phase timings.
+    """
+    profiler = GenerationProfiler()
+    with profiler:
+        _run_multi_week_generation(shops, weeks, area, profiler)
+    return profiler.save(weeks[0], area, mode=mode, week_count=len(weeks))
+
+def _run_multi_week_generation(shops, weeks, area, profiler):
     from accounts.models import User
 
     # 1. Prepare Data
+    profiler.phase('context_load')
     # Filter users by Area
     all_users = list(User.objects.filter(is_active=True, is_approved=True, area=area).select_related('preference'))
 
@@ -500,16 +575,25 @@ def _generate_multi_week_schedule(shops, weeks, area):
              # Just in case
              roving_shop, _ = Shop.objects.get_or_create(name='Roving', area=area, is_active=True)
 
+    # Scoring weights for this Area, compiled once for the whole run
+    scorer = compile_scoring_rules(area)
+
+    profiler.user_count = len(all_users)
+    profiler.shop_count = len(shops)
+
     # 2. Iterate Weeks
     for schedule in weeks:
         week_start = schedule.week_start_date
 
         # Clear existing
-        schedule.shifts.filter(shop__in=shops).delete()
+        profiler.phase('persistence')
+        with bumps_suppressed():
+            schedule.shifts.filter(shop__in=shops).delete() # Bumped after the bulk_create below
         if schedule.is_published:
             ScheduleChangeLog.objects.create(schedule=schedule, message="Regenerated.")
 
         # Prepare History Data for Scoring
+        profiler.phase('history_load')
         # a. Prev week (relative to this schedule week)
         prev_week_start = week_start - datetime.timedelta(days=7)
         prev_week_end = week_start - datetime.timedelta(days=1)
@@ -562,9 +646,12 @@ def _generate_multi_week_schedule(shops, weeks, area):
                  # Enable history usage since we now have simulated logs
                  use_attendance_history = True
 
+        history_index = HistoryIndex(history_data)
         current_assignments = CurrentWeekAssignments()
+        new_shifts = [] # Saved in one batch at the end of the week
 
         # Determine Max Duty Slots required
+        profiler.phase('duty_slots')
         # Iterate through shops to find max duty needed
         max_duty_slots = 0
         for shop in shops:
@@ -630,7 +717,7 @@ def _generate_multi_week_schedule(shops, weeks, area):
 
                     valid_candidates = []
                     for user in available_users:
-                        score, breakdown = calculate_assignment_score(user, shop, current_date, history_data, current_assignments, min_duty_count_among_eligible=min_duty, use_attendance_history=use_attendance_history)
+                        score, breakdown = calculate_assignment_score(user, shop, current_date, history_index, current_assignments, min_duty_count_among_eligible=min_duty, use_attendance_history=use_attendance_history, scorer=scorer)
                         valid_candidates.append((user, score, breakdown))
 
                     if valid_candidates:
@@ -650,7 +737,7 @@ def _generate_multi_week_schedule(shops, weeks, area):
                             final_score = best_score
                             final_breakdown = best_breakdown
 
-                        Shift.objects.create(
+                        new_shifts.append(Shift(
                             schedule=schedule,
                             user=best_user,
                             shop=shop,
@@ -658,10 +745,11 @@ def _generate_multi_week_schedule(shops, weeks, area):
                             role='main',
                             score=final_score,
                             score_breakdown=final_breakdown
-                        )
+                        ))
                         current_assignments.add_assignment(best_user.id, shop.id, current_date)
 
         # Standby Assignment Loop (Per Day)
+        profiler.phase('standby')
         # "All staff not assigned as Duty Staff are automatically assigned as Standby Staff of that same day."
         # "The Standby Staff will be ranked based on who had the least Duty Staff assignment during the previous week."
 
@@ -679,12 +767,7 @@ def _generate_multi_week_schedule(shops, weeks, area):
             for user in all_users:
                 if user.id not in duty_users_today:
                     # Rank metric: Least Duty Staff assignment during PREVIOUS WEEK.
-                    # Count prev week duty shifts
-                    duty_prev_week = 0
-                    for s in history_data['prev_week_shifts']:
-                        if s.user_id == user.id and s.role == 'main':
-                            duty_prev_week += 1
-
+                    duty_prev_week = history_index.prev_duty_counts.get(user.id, 0)
                     standby_candidates.append((user, duty_prev_week))
 
             # Sort by least duty prev week (asc)
@@ -705,7 +788,7 @@ def _generate_multi_week_schedule(shops, weeks, area):
             # Create Shifts
             # We use Roving shop for the "Universal Pool".
             for idx, (user, prev_duty) in enumerate(standby_candidates):
-                Shift.objects.create(
+                new_shifts.append(Shift(
                     schedule=schedule,
                     user=user,
                     shop=roving_shop,
@@ -713,7 +796,13 @@ def _generate_multi_week_schedule(shops, weeks, area):
                     role='backup',
                     score=None, # No score for standby as requested
                     score_breakdown=None
-                )
+                ))
+
+        # Saved before the next week's history load, which reads these as prev_week_shifts
+        profiler.phase('persistence')
+        Shift.objects.bulk_create(new_shifts)
+        bump_grid_version(schedule.week_start_date) # bulk_create sends no post_save
+        bump_feed_version()
 
 
 @login_required
@@ -773,20 +862,11 @@ def shift_add(request, schedule_id, date, shop_id, role):
         'form': form, 'date': target_date, 'shop': shop, 'role': role
     })
 
-@login_required
-def regenerate_remaining_week(request, schedule_id):
-    if request.user.tier not in ['supervisor', 'administrator'] and not request.user.is_superuser:
-        return HttpResponseForbidden()
-
-    schedule = get_object_or_404(Schedule, id=schedule_id)
-    today = timezone.localdate()
-    start_date = today + datetime.timedelta(days=1)
+def _regenerate_days(request, schedule, start_date):
+    """
+    Replaces the schedule's shifts from start_date to the end of its week.
+    """
     week_start = schedule.week_start_date
-    week_end = week_start + datetime.timedelta(days=6)
-
-    if start_date > week_end:
-        messages.warning(request, "No remaining days in this week to regenerate.")
-        return redirect('scheduling:my_schedule')
 
     # 1. Clear future shifts
     shifts_to_delete = Shift.objects.filter(schedule=schedule, date__gte=start_date)
@@ -800,7 +880,7 @@ def regenerate_remaining_week(request, schedule_id):
 
     # 2. Prepare Context for Generation
     # a. Shops
-    shops_qs = Shop.objects.filter(is_active=True)
+    shops_qs = Shop.objects.filter(is_active=True).select_related('area')
     roving = shops_qs.filter(name='Roving').first()
     others = list(shops_qs.exclude(name='Roving'))
     if roving:
@@ -842,6 +922,13 @@ def regenerate_remaining_week(request, schedule_id):
          history_data['prev_week_logs'] = simulated_logs
          use_attendance_history = True
 
+    history_index = HistoryIndex(history_data)
+    # The week spans every Area: each shop is scored with its own Area's weights
+    scorers = {}
+    for shop in shops:
+        if shop.area_id not in scorers:
+            scorers[shop.area_id] = compile_scoring_rules(shop.area)
+
     # c. Initialize Current Assignments with EXISTING shifts (past days of this week)
     current_assignments = CurrentWeekAssignments()
     existing_shifts = Shift.objects.filter(schedule=schedule, date__lt=start_date)
@@ -892,7 +979,7 @@ def regenerate_remaining_week(request, schedule_id):
 
                 valid_candidates = []
                 for user in available_users:
-                    score, breakdown = calculate_assignment_score(user, shop, current_date, history_data, current_assignments, min_duty_count_among_eligible=min_duty, use_attendance_history=use_attendance_history)
+                    score, breakdown = calculate_assignment_score(user, shop, current_date, history_index, current_assignments, min_duty_count_among_eligible=min_duty, use_attendance_history=use_attendance_history, scorer=scorers[shop.area_id])
                     valid_candidates.append((user, score, breakdown))
 
                 if valid_candidates:
@@ -934,10 +1021,7 @@ def regenerate_remaining_week(request, schedule_id):
         standby_candidates = []
         for user in all_users:
             if user.id not in duty_users_today:
-                duty_prev_week = 0
-                for s in history_data['prev_week_shifts']:
-                    if s.user_id == user.id and s.role == 'main':
-                        duty_prev_week += 1
+                duty_prev_week = history_index.prev_duty_counts.get(user.id, 0)
                 standby_candidates.append((user, duty_prev_week))
 
         random.shuffle(standby_candidates)
@@ -954,6 +1038,27 @@ def regenerate_remaining_week(request, schedule_id):
                 score_breakdown=None
             )
 
+@login_required
+def regenerate_remaining_week(request, schedule_id):
+    if request.user.tier not in ['supervisor', 'administrator'] and not request.user.is_superuser:
+        return HttpResponseForbidden()
+
+    schedule = get_object_or_404(Schedule, id=schedule_id)
+    today = timezone.localdate()
+    start_date = today + datetime.timedelta(days=1)
+    week_start = schedule.week_start_date
+    week_end = week_start + datetime.timedelta(days=6)
+
+    if start_date > week_end:
+        messages.warning(request, "No remaining days in this week to regenerate.")
+        return redirect('scheduling:my_schedule')
+
+    with bumps_suppressed():
+        _regenerate_days(request, schedule, start_date)
+    # The per-row signals were off: one bump for the whole regeneration
+    bump_grid_version(week_start)
+    bump_feed_version()
+
     messages.success(request, f"Schedule regenerated from {start_date} to {week_end}.")
     return redirect('scheduling:my_schedule')
 
@@ -1060,9 +1165,6 @@ def shift_update(request, shift_id):
 
     return redirect('scheduling:my_schedule')
 
-def _generate_schedule(shops, schedule):
-    return _generate_multi_week_schedule(shops, [schedule])
-
 def reset_system_data(request_user):
     """
     Deletes all data except:
@@ -1085,6 +1187,10 @@ def reset_system_data(request_user):
     ScheduleChangeLog.objects.all().delete()
     UserPriority.objects.all().delete()
     UserShopScore.objects.all().delete()
+    ScoreRunLedger.objects.all().delete()
+    ScoreEvent.objects.all().delete()
+    ScoreCompaction.objects.all().delete()
+    ScoreBackfill.objects.all().delete()
     Preference.objects.all().delete()
     PasswordResetRequest.objects.all().delete()
 
@@ -1104,6 +1210,13 @@ def reset_data(request):
 
     return render(request, 'scheduling/reset_confirm.html')
 
+@user_passes_test(lambda u: u.is_authenticated and (u.tier == 'administrator' or u.is_superuser))
+def schedule_grid_stats(request):
+    """
+    Grid cache statistics of the process serving the request (see grid.grid_cache_stats).
+    """
+    return JsonResponse({**grid_cache_stats(), 'pid': os.getpid()})
+
 @user_passes_test(lambda u: u.is_authenticated and (u.tier == 'administrator' or u.is_superuser))
 def load_test_data(request):
     from accounts.models import Area
@@ -1214,11 +1327,11 @@ def load_test_data(request):
             # Generate for Area 1
             # Get shops including Roving for Area 1
             shops_a1 = list(Shop.objects.filter(area=area1)) # Includes regular + roving
-            _generate_multi_week_schedule(shops_a1, [schedule], area1)
+            _generate_multi_week_schedule(shops_a1, [schedule], area1, mode='load_test')
 
             # Generate for Area 2
             shops_a2 = list(Shop.objects.filter(area=area2))
-            _generate_multi_week_schedule(shops_a2, [schedule], area2)
+            _generate_multi_week_schedule(shops_a2, [schedule], area2, mode='load_test')
 
             schedule.is_published = True
             schedule.save()
@@ -1288,6 +1401,7 @@ def load_test_data(request):
 
                 # Update Scores
                 update_scores_for_date(sim_date)
+                compact_scores(as_of_date=sim_date, keep_snapshot=(sim_date.weekday() == 6))
 
         messages.success(request, "Load Test Data Generated Successfully (8 Weeks, 2 Areas).")
         return redirect('scheduling:load_test_data')